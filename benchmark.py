@@ -0,0 +1,817 @@
+#!/usr/bin/env python
+
+"""
+benchmark.py -- Udacity conference server-side Python App Engine
+    load & benchmark driver; seeds the testbed datastore stub with
+    synthetic conferences, sessions, speakers & profiles, then times
+    ConferenceApi endpoints and main.py task handlers, reporting
+    throughput, latency percentiles & RPC counts as JSON
+
+usage:
+    APPENGINE_SDK=/path/to/google_appengine python benchmark.py \\
+        --conferences 10000 --sessions 100000 --output results.json
+
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import os
+import random
+import sys
+import time
+import urllib
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# the SDK must be on sys.path before any App Engine or app module import
+if os.environ.get('APPENGINE_SDK'):
+    sys.path.insert(0, os.environ['APPENGINE_SDK'])
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+from google.appengine.api import apiproxy_rpc
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+from protorpc import message_types
+
+BENCH_EMAIL = 'benchmark@example.com'
+PUT_BATCH_SIZE = 500
+SESSION_TYPES = ['lecture', 'workshop', 'keynote', 'panel']
+CITIES = ['London', 'Paris', 'Tokyo', 'Chicago', 'San Francisco']
+TOPICS = ['Web', 'Mobile', 'Cloud', 'Data', 'Security']
+# a page of sessions takes one query, with one filter or with several
+QUERY_SESSION_RPC_BUDGET = {'datastore_v3': 1, 'memcache': 0}
+SYLLABLES = ['an', 'bo', 'ca', 'de', 'el', 'fi', 'go', 'ha', 'is', 'jo',
+             'ka', 'li', 'mo', 'na', 'or', 'pe', 'ra', 'su', 'ti', 'vo']
+
+
+class _LatencyRPC(apiproxy_rpc.RPC):
+    """_LatencyRPC -- stub RPC that completes latency seconds after it was
+    made, whether or not it is the one being waited on, so RPCs in flight
+    together overlap"""
+    latency = 0
+
+    def _MakeCallImpl(self):
+        self._complete_at = time.time() + self.latency
+        super(_LatencyRPC, self)._MakeCallImpl()
+
+    @property
+    def state(self):
+        # UserRPC.wait_any() returns the first RPC found finishing
+        if (self._state == apiproxy_rpc.RPC.RUNNING and
+                time.time() >= self._complete_at):
+            super(_LatencyRPC, self)._WaitImpl()
+        return self._state
+
+    def _WaitImpl(self):
+        delay = self._complete_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        return super(_LatencyRPC, self)._WaitImpl()
+
+
+def _injectLatency(stub, latency):
+    """Make every RPC to stub, synchronous or not, take latency seconds."""
+    def create_rpc():
+        rpc = _LatencyRPC(stub=stub)
+        rpc.latency = latency
+        return rpc
+    stub.CreateRPC = create_rpc
+
+
+def _activateTestbed(rpc_latency_ms=0):
+    """Activate App Engine service stubs with strongly consistent queries
+    and a signed-in endpoints user; datastore & memcache RPCs take at least
+    rpc_latency_ms each, like they do against the production services."""
+    bed = testbed.Testbed()
+    bed.activate()
+    # endpoints derives the API revision from the minor version id
+    bed.setup_env(overwrite=True, current_version_id='benchmark.1')
+    policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+        probability=1)
+    bed.init_datastore_v3_stub(consistency_policy=policy)
+    bed.init_memcache_stub()
+    bed.init_taskqueue_stub(root_path=APP_DIR)
+    bed.init_urlfetch_stub()
+    bed.init_mail_stub()
+    bed.init_app_identity_stub()
+    bed.init_user_stub()
+    if rpc_latency_ms:
+        for service in ('datastore_v3', 'memcache'):
+            _injectLatency(bed.get_stub(service), rpc_latency_ms / 1000.0)
+    os.environ['ENDPOINTS_AUTH_EMAIL'] = BENCH_EMAIL
+    os.environ['ENDPOINTS_AUTH_DOMAIN'] = 'example.com'
+    return bed
+
+
+def _putInBatches(entities):
+    for i in range(0, len(entities), PUT_BATCH_SIZE):
+        ndb.put_multi(entities[i:i + PUT_BATCH_SIZE])
+
+
+def _name(rnd, syllables):
+    return ''.join(rnd.choice(SYLLABLES) for _ in range(syllables)).title()
+
+
+def seed(args, rnd):
+    """Write synthetic data; return the keys scenarios pick from."""
+    from conference import ConferenceApi
+    from models import Conference
+    from models import Profile
+    from models import Session
+    from models import Speaker
+    from models import SpeakerSessionCount
+
+    profiles = [Profile(key=ndb.Key(Profile, BENCH_EMAIL),
+                        displayName='Benchmark', mainEmail=BENCH_EMAIL)]
+    profiles += [Profile(key=ndb.Key(Profile, 'user%d@example.com' % i),
+                         displayName=_name(rnd, 2),
+                         mainEmail='user%d@example.com' % i)
+                 for i in range(args.profiles)]
+    _putInBatches(profiles)
+
+    speakers = [Speaker(name='%s %s' % (_name(rnd, 2), _name(rnd, 3)),
+                        bio='Synthetic speaker')
+                for _ in range(args.speakers)]
+    _putInBatches(speakers)
+
+    today = datetime.date.today()
+    conferences = []
+    for i in range(args.conferences):
+        # the benchmark user organizes every tenth conference
+        organizer = profiles[i % min(len(profiles), 10)]
+        start = today + datetime.timedelta(days=rnd.randint(0, 365))
+        seats = rnd.randint(1, 500)
+        conferences.append(Conference(
+            parent=organizer.key,
+            name='Conference %d' % i,
+            description='Synthetic conference',
+            organizerUserId=organizer.key.id(),
+            topics=rnd.sample(TOPICS, 2),
+            city=rnd.choice(CITIES),
+            startDate=start,
+            month=start.month,
+            endDate=start + datetime.timedelta(days=2),
+            maxAttendees=seats,
+            seatsAvailable=seats))
+    _putInBatches(conferences)
+
+    sessions = []
+    session_counts = collections.Counter()
+    for i in range(args.sessions):
+        parent = conferences[i % len(conferences)]
+        session_speaker = rnd.choice(speakers) if speakers else None
+        sessions.append(Session(
+            parent=parent.key,
+            name='Session %d' % i,
+            highlights='Synthetic session',
+            speaker_key=session_speaker.key if session_speaker else None,
+            speaker_name=session_speaker.name if session_speaker else None,
+            duration=rnd.choice([30, 45, 60, 90]),
+            session_type=rnd.choice(SESSION_TYPES),
+            date=parent.startDate,
+            start_time=datetime.time(rnd.randint(8, 20),
+                                     rnd.choice([0, 30]))))
+        if session_speaker:
+            session_counts[parent.key, session_speaker.key] += 1
+    _putInBatches(sessions)
+    _putInBatches([SpeakerSessionCount(
+        key=ConferenceApi._speakerSessionCountKey(conf_key, speaker_key),
+        count=count)
+        for (conf_key, speaker_key), count in session_counts.items()])
+
+    return {
+        'conferences': [conf.key.urlsafe() for conf in conferences],
+        'ownConferences': [conf.key.urlsafe() for conf in conferences
+                           if conf.organizerUserId == BENCH_EMAIL],
+        'speakers': [speaker.key.urlsafe() for speaker in speakers],
+        'speakerNames': [speaker.name for speaker in speakers],
+        'sessions': [each_session.key.urlsafe()
+                     for each_session in sessions],
+    }
+
+
+def scenarios(keys, rnd):
+    """Return (name, operation) pairs; each operation runs one call."""
+    import conference
+    import export
+    import main
+    import mapper
+    from conference import ConferenceApi
+    from models import AgendaSessionForm
+    from models import AgendaSpeakerForm
+    from models import ConferenceForm
+    from models import ConferenceQueryForm
+    from models import ConferenceQueryForms
+    from models import ProfileMiniForm
+    from models import SessionForm
+    from models import SessionQueryForm
+    from models import SpeakerMiniForm
+    from models import WishlistUpdateForm
+
+    # getCacheStats & getEndpointStats are for admins only
+    conference.ADMIN_EMAILS = (BENCH_EMAIL,)
+
+    def endpoint(method_name, container=None, **fields):
+        def call():
+            values = dict((name, value() if callable(value) else value)
+                          for name, value in fields.items())
+            request_class = (container.combined_message_class
+                             if hasattr(container, 'combined_message_class')
+                             else container or message_types.VoidMessage)
+            return getattr(ConferenceApi(), method_name)(
+                request_class(**values))
+        return call
+
+    def handler(path, method='POST', **params):
+        def call():
+            values = dict((name, value() if callable(value) else value)
+                          for name, value in params.items())
+            if method == 'GET':
+                response = main.app.get_response(
+                    path + '?' + urllib.urlencode(values, doseq=True))
+            else:
+                response = main.app.get_response(
+                    path, POST=urllib.urlencode(values, doseq=True))
+            if response.status_int >= 400:
+                raise RuntimeError('%s returned %s' % (path,
+                                                       response.status))
+            return response
+        return call
+
+    def conf():
+        return rnd.choice(keys['conferences'])
+
+    def own_conf():
+        return rnd.choice(keys['ownConferences'])
+
+    def speaker():
+        return rnd.choice(keys['speakers'])
+
+    def session_form():
+        start = datetime.date.today() + datetime.timedelta(
+            days=rnd.randint(0, 365))
+        return dict(name='Session %s' % _name(rnd, 3),
+                    highlights='Synthetic session',
+                    duration=rnd.choice([30, 45, 60, 90]),
+                    session_type=rnd.choice(SESSION_TYPES),
+                    date=start.isoformat(),
+                    start_time='%02d:%02d' % (rnd.randint(8, 20),
+                                              rnd.choice([0, 30])))
+
+    def agenda_speakers():
+        return [AgendaSpeakerForm(ref='speaker%d' % i,
+                                  name='%s %s' % (_name(rnd, 2),
+                                                  _name(rnd, 3)),
+                                  bio='Synthetic speaker')
+                for i in range(2)]
+
+    def agenda_sessions():
+        return [AgendaSessionForm(session=SessionForm(**session_form()),
+                                  speakerRef='speaker%d' % (i % 2))
+                for i in range(8)] + [
+            AgendaSessionForm(session=SessionForm(speaker_key=speaker(),
+                                                  **session_form()))
+            for _ in range(2)]
+
+    # registrations walk the conferences in order so that each one is
+    # undone by the matching unregistration; so do single wishlist adds &
+    # removals, over sessions updateWishlist does not pick
+    registrations = iter(keys['conferences'] * 2)
+    unregistrations = iter(keys['conferences'] * 2)
+    wishlist_sessions = keys['sessions'][::2]
+    wishlist_additions = iter(keys['sessions'][1::2])
+    wishlist_removals = iter(keys['sessions'][1::2])
+
+    # status requests poll jobs started now; task runs start their own
+    export_job = export.startExport(['Conference'], 'ndjson')[0].key.id()
+    mapper_job = mapper.startMapper('speaker_name_lower').key.id()
+
+    return [
+        ('getProfile', endpoint('getProfile')),
+        ('saveProfile', endpoint(
+            'saveProfile', ProfileMiniForm,
+            displayName=lambda: _name(rnd, 2))),
+        ('createConference', endpoint(
+            'createConference', ConferenceForm,
+            name=lambda: 'Conference %s' % _name(rnd, 3),
+            description='Synthetic conference',
+            topics=lambda: rnd.sample(TOPICS, 2),
+            city=lambda: rnd.choice(CITIES),
+            startDate=lambda: (datetime.date.today() + datetime.timedelta(
+                days=rnd.randint(0, 365))).isoformat(),
+            maxAttendees=lambda: rnd.randint(1, 500))),
+        ('updateConference', endpoint(
+            'updateConference', conference.CONF_POST_REQUEST,
+            websafeConferenceKey=own_conf,
+            description=lambda: 'Updated %s' % _name(rnd, 3))),
+        ('getConference', endpoint(
+            'getConference', conference.CONF_GET_REQUEST,
+            websafeConferenceKey=conf)),
+        ('getConferencesCreated', endpoint('getConferencesCreated')),
+        ('queryConferences', endpoint(
+            'queryConferences', ConferenceQueryForms)),
+        ('queryConferences.city', endpoint(
+            'queryConferences', ConferenceQueryForms,
+            filters=lambda: [ConferenceQueryForm(
+                field='CITY', operator='EQ', value=rnd.choice(CITIES))])),
+        ('queryConferenceSummaries', endpoint(
+            'queryConferenceSummaries', ConferenceQueryForms)),
+        ('filterPlayground', endpoint('filterPlayground')),
+        ('getCacheStats', endpoint('getCacheStats')),
+        ('getEndpointStats', endpoint('getEndpointStats')),
+        ('createSession', endpoint(
+            'createSession', conference.SESSION_CREATE_REQUEST,
+            websafeConferenceKey=own_conf, speaker_key=speaker,
+            **session_form())),
+        ('importAgenda', endpoint(
+            'importAgenda', conference.AGENDA_IMPORT_REQUEST,
+            websafeConferenceKey=own_conf, speakers=agenda_speakers,
+            sessions=agenda_sessions)),
+        ('getConferenceSessions', endpoint(
+            'getConferenceSessions', conference.CONF_SESSION_GET_REQUEST,
+            websafeConferenceKey=conf)),
+        ('getConferenceSessionsByType', endpoint(
+            'getConferenceSessionsByType',
+            conference.CONF_SESSION_TYPE_GET_REQUEST,
+            websafeConferenceKey=conf,
+            session_type=lambda: rnd.choice(SESSION_TYPES))),
+        ('querySession', endpoint(
+            'querySession', conference.CONF_SESSION_QUERY_GET_REQUEST,
+            websafeConferenceKey=conf,
+            filters=lambda: [
+                SessionQueryForm(field='DURATION', operator='LTEQ',
+                                 value='60'),
+                SessionQueryForm(field='TYPE', operator='NE',
+                                 value='workshop')])),
+        ('solvedProblematicQuery', endpoint('solvedProblematicQuery')),
+        ('createSpeaker', endpoint(
+            'createSpeaker', SpeakerMiniForm,
+            name=lambda: '%s %s' % (_name(rnd, 2), _name(rnd, 3)),
+            bio='Synthetic speaker')),
+        ('updateSpeaker', endpoint(
+            'updateSpeaker', conference.SPEAKER_POST_REQUEST,
+            websafeSpeakerKey=speaker,
+            bio=lambda: 'Updated %s' % _name(rnd, 3))),
+        ('getSpeaker', endpoint(
+            'getSpeaker', conference.SPEAKER_GET_REQUEST,
+            websafeSpeakerKey=speaker)),
+        ('getAllSpeakers', endpoint(
+            'getAllSpeakers', conference.PAGE_GET_REQUEST)),
+        ('searchSpeakers', endpoint(
+            'searchSpeakers', conference.SPEAKER_SEARCH_REQUEST,
+            prefix=lambda: rnd.choice(SYLLABLES))),
+        ('getSpeakerSummaries', endpoint(
+            'getSpeakerSummaries', conference.PAGE_GET_REQUEST)),
+        ('getSessionsBySpeaker', endpoint(
+            'getSessionsBySpeaker', conference.SPEAKER_SESSIONS_GET_REQUEST,
+            websafeSpeakerKey=speaker)),
+        ('getSessionsBySpeakerName', endpoint(
+            'getSessionsBySpeakerName',
+            conference.SESSION_SPEAKER_GET_REQUEST,
+            speaker_name=lambda: rnd.choice(keys['speakerNames']))),
+        ('getFeaturedSpeaker', endpoint('getFeaturedSpeaker')),
+        ('getConferenceFeaturedSpeakers', endpoint(
+            'getConferenceFeaturedSpeakers', conference.CONF_GET_REQUEST,
+            websafeConferenceKey=conf)),
+        ('getFeaturedSpeakersForConferences', endpoint(
+            'getFeaturedSpeakersForConferences',
+            conference.CONFS_FEATURED_SPEAKERS_GET_REQUEST,
+            websafeConferenceKeys=lambda: rnd.sample(
+                keys['conferences'], min(10, len(keys['conferences']))))),
+        ('addSessionToWishlist', endpoint(
+            'addSessionToWishlist', conference.SESSION_GET_REQUEST,
+            websafeSessionKey=lambda: next(wishlist_additions))),
+        ('deleteSessionInWishlist', endpoint(
+            'deleteSessionInWishlist', conference.SESSION_GET_REQUEST,
+            websafeSessionKey=lambda: next(wishlist_removals))),
+        ('updateWishlist', endpoint(
+            'updateWishlist', WishlistUpdateForm,
+            add=lambda: rnd.sample(wishlist_sessions,
+                                   min(10, len(wishlist_sessions))))),
+        ('getSessionsInWishlist', endpoint(
+            'getSessionsInWishlist', conference.PAGE_GET_REQUEST)),
+        ('registerForConference', endpoint(
+            'registerForConference', conference.CONF_GET_REQUEST,
+            websafeConferenceKey=lambda: next(registrations))),
+        ('isRegisteredForConference', endpoint(
+            'isRegisteredForConference', conference.CONF_GET_REQUEST,
+            websafeConferenceKey=conf)),
+        ('getConferencesToAttend', endpoint(
+            'getConferencesToAttend', conference.PAGE_GET_REQUEST)),
+        ('getConferenceAttendees', endpoint(
+            'getConferenceAttendees', conference.CONF_ATTENDEES_GET_REQUEST,
+            websafeConferenceKey=own_conf)),
+        ('unregisterFromConference', endpoint(
+            'unregisterFromConference', conference.CONF_GET_REQUEST,
+            websafeConferenceKey=lambda: next(unregistrations))),
+        ('getAnnouncement', endpoint('getAnnouncement')),
+        ('cron.set_announcement', handler(
+            '/crons/set_announcement', method='GET')),
+        ('task.send_confirmation_email', handler(
+            '/tasks/send_confirmation_email', email=BENCH_EMAIL,
+            conferenceInfo='Synthetic conference')),
+        ('task.find_featured_speaker', handler(
+            '/tasks/find_featured_speaker', wsck=conf,
+            websafe_speaker_key=speaker, speaker_name='Synthetic speaker',
+            session_name='Synthetic session')),
+        ('task.rebuild_agenda', handler(
+            '/tasks/rebuild_agenda', wsck=conf)),
+        ('task.speaker_renamed', handler(
+            '/tasks/speaker_renamed', websafe_speaker_key=speaker)),
+        ('task.reconcile_seats', handler(
+            '/tasks/reconcile_seats', wsck=conf)),
+        ('export.start', handler('/export', kind='Conference')),
+        ('export.status', handler('/export', method='GET',
+                                  job=export_job)),
+        ('task.export', handler(
+            '/tasks/export', job_id=lambda: export.startExport(
+                ['Conference'], 'ndjson')[0].key.id())),
+        ('mapper.start', handler('/mapper', name='speaker_name_lower')),
+        ('mapper.status', handler('/mapper', method='GET',
+                                  job=mapper_job)),
+        ('task.mapper', handler(
+            '/tasks/mapper', job_id=lambda: mapper.startMapper(
+                'speaker_name_lower').key.id())),
+    ]
+
+
+def registrationLoad(registrants, seats):
+    """Register registrants distinct users for a new conference of seats
+    seats, all at once from one thread each; return the outcome counts.
+
+    Raise AssertionError if a registration fails with anything but a
+    ConflictException, the conference is oversold, or the seat shards and
+    the SeatReservation ledger disagree.
+    """
+    import threading
+    from google.appengine.runtime import request_environment
+
+    import conference
+    from conference import ConferenceApi
+    from models import Conference
+    from models import Profile
+    from models import SeatReservation
+
+    conf = Conference(parent=ndb.Key(Profile, BENCH_EMAIL),
+                      name='Registration load', organizerUserId=BENCH_EMAIL,
+                      maxAttendees=seats, seatsAvailable=seats)
+    conf.put()
+    request_class = conference.CONF_GET_REQUEST.combined_message_class
+    outcomes = collections.Counter()
+    outcomes_lock = threading.Lock()
+    start = threading.Event()
+
+    def register(environ):
+        # like a request thread of the runtime, each has its own os.environ
+        request_environment.current_request.Init(sys.stderr, environ)
+        start.wait()
+        try:
+            ConferenceApi().registerForConference(
+                request_class(websafeConferenceKey=conf.key.urlsafe()))
+            outcome = 'registered'
+        except Exception as e:
+            outcome = type(e).__name__
+        with outcomes_lock:
+            outcomes[outcome] += 1
+
+    environ = dict(os.environ)
+    os_environ = os.environ
+    request_environment.current_request.Init(sys.stderr, dict(environ))
+    request_environment.PatchOsEnviron()
+    try:
+        threads = [threading.Thread(target=register, args=(dict(
+            environ, ENDPOINTS_AUTH_EMAIL='registrant%d@example.com' % i),))
+            for i in range(registrants)]
+        for thread in threads:
+            thread.start()
+        started = time.time()
+        start.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+    finally:
+        os.environ = os_environ
+
+    conf = conf.key.get(use_cache=False, use_memcache=False)
+    shards = ndb.get_multi(
+        ConferenceApi._seatShardKeys(conf.key, conf.seatShards),
+        use_cache=False, use_memcache=False)
+    reservations = SeatReservation.query(
+        SeatReservation.conferenceKey == conf.key).count()
+    result = {
+        'registrants': registrants,
+        'seats': seats,
+        'seconds': elapsed,
+        'outcomes': dict(outcomes),
+        'reservations': reservations,
+        'seatsLeft': sum(shard.seats for shard in shards),
+    }
+    problems = []
+    unexpected = sorted(outcome for outcome in outcomes
+                        if outcome not in ('registered', 'ConflictException'))
+    if unexpected:
+        problems.append('registrations failed with %s' % ', '.join(
+            '%d %s' % (outcomes[outcome], outcome) for outcome in unexpected))
+    if reservations > seats:
+        problems.append('%d reservations for %d seats' % (reservations,
+                                                           seats))
+    if any(shard.seats < 0 for shard in shards):
+        problems.append('a shard has fewer than 0 seats')
+    if result['seatsLeft'] + reservations != seats:
+        problems.append('%d seats left with %d reservations' % (
+            result['seatsLeft'], reservations))
+    if outcomes['registered'] != reservations:
+        problems.append('%d registrations returned for %d reservations' % (
+            outcomes['registered'], reservations))
+    if problems:
+        raise AssertionError('Registration load: ' + '; '.join(problems))
+    return result
+
+
+def querySessionRpcs(sessions):
+    """Query a new conference of sessions sessions with one filter and
+    with several, each within QUERY_SESSION_RPC_BUDGET; return the RPCs
+    each query issued.
+
+    Raise AssertionError if a query goes over budget, as it would if
+    each filter cost a probe of its own again.
+    """
+    import conference
+    from conference import ConferenceApi
+    from instrumentation import rpcBudget
+    from models import Conference
+    from models import Profile
+    from models import Session
+    from models import SessionQueryForm
+
+    conf = Conference(parent=ndb.Key(Profile, BENCH_EMAIL),
+                      name='Session queries', organizerUserId=BENCH_EMAIL)
+    conf.put()
+    _putInBatches([Session(parent=conf.key, name='Session %d' % i,
+                           speaker_name='Synthetic speaker',
+                           duration=60, session_type='lecture',
+                           date=datetime.date.today(),
+                           start_time=datetime.time(10, 0))
+                   for i in range(sessions)])
+    request_class = (
+        conference.CONF_SESSION_QUERY_GET_REQUEST.combined_message_class)
+    filter_sets = {
+        'oneFilter': [
+            SessionQueryForm(field='DURATION', operator='LTEQ', value='60')],
+        'severalFilters': [
+            SessionQueryForm(field='DURATION', operator='LTEQ', value='60'),
+            SessionQueryForm(field='TYPE', operator='NE', value='workshop'),
+            SessionQueryForm(field='START_TIME', operator='GTEQ',
+                             value='09:00')],
+    }
+    result = {}
+    for name, filters in sorted(filter_sets.items()):
+        ndb.get_context().clear_cache()
+        with rpcBudget(**QUERY_SESSION_RPC_BUDGET) as stats:
+            ConferenceApi().querySession(request_class(
+                websafeConferenceKey=conf.key.urlsafe(), filters=filters))
+        result[name] = dict((service, calls)
+                            for service, (calls, ms) in stats.rpcs.items())
+    return result
+
+
+def serializationBenchmark(entities, rnd, passes=3):
+    """Copy entities unsaved entities of each model to their forms with
+    every serializer in serializers.SERIALIZERS; return the fastest of
+    passes runs of each."""
+    from models import Conference
+    from models import Profile
+    from models import Session
+    from models import Speaker
+    from serializers import SERIALIZERS
+
+    today = datetime.date.today()
+    conf_key = ndb.Key(Profile, BENCH_EMAIL, Conference, 1)
+    speaker_keys = [ndb.Key(Speaker, i + 1) for i in range(50)]
+    session_keys = [ndb.Key(Session, i + 1, parent=conf_key)
+                    for i in range(10)]
+    factories = {
+        Conference: lambda i: Conference(
+            parent=ndb.Key(Profile, BENCH_EMAIL), id=i + 1,
+            name='Conference %d' % i, description='Synthetic conference',
+            organizerUserId=BENCH_EMAIL, topics=rnd.sample(TOPICS, 2),
+            city=rnd.choice(CITIES), startDate=today, month=today.month,
+            endDate=today + datetime.timedelta(days=2), maxAttendees=100,
+            seatsAvailable=rnd.randint(0, 100)),
+        Session: lambda i: Session(
+            parent=conf_key, id=i + 1, name='Session %d' % i,
+            highlights='Synthetic session',
+            speaker_key=rnd.choice(speaker_keys),
+            speaker_name='%s %s' % (_name(rnd, 2), _name(rnd, 3)),
+            duration=rnd.choice([30, 45, 60, 90]),
+            session_type=rnd.choice(SESSION_TYPES), date=today,
+            start_time=datetime.time(rnd.randint(8, 20))),
+        Speaker: lambda i: Speaker(
+            id=i + 1, name='%s %s' % (_name(rnd, 2), _name(rnd, 3)),
+            bio='Synthetic speaker'),
+        Profile: lambda i: Profile(
+            id='user%d@example.com' % i, displayName=_name(rnd, 2),
+            mainEmail='user%d@example.com' % i,
+            teeShirtSize='NOT_SPECIFIED',
+            conferenceKeysToAttend=[conf_key.urlsafe()],
+            sessionKeysWishlist=session_keys),
+    }
+
+    result = {}
+    for (model_class, form_class), serializer in sorted(
+            SERIALIZERS.items(), key=lambda item: item[0][0].__name__):
+        batch = [factories[model_class](i) for i in range(entities)]
+        seconds = None
+        for _ in range(passes):
+            started = time.time()
+            for entity in batch:
+                serializer.serialize(entity)
+            elapsed = time.time() - started
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+        result['%s/%s' % (model_class.__name__, form_class.__name__)] = {
+            'entities': entities,
+            'seconds': seconds,
+            'microsecondsPerEntity': seconds * 1e6 / entities,
+        }
+    return result
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(operation, iterations):
+    """Run operation iterations times; return its latency & RPC figures
+and how many of the endpoint & handler calls it made went over their
+RPC_BUDGETS."""
+    from instrumentation import ENDPOINT_STATS
+    from instrumentation import rpcBudget
+
+    def over_budget():
+        return sum(stats['overBudget'] for stats in ENDPOINT_STATS.values())
+
+    latencies = []
+    rpcs = {}
+    entities_read = entities_written = errors = 0
+    first_error = None
+    over_budget_before = over_budget()
+    started = time.time()
+    for _ in range(iterations):
+        # every call starts with a cold in-context cache, like a request
+        ndb.get_context().clear_cache()
+        with rpcBudget() as stats:
+            call_started = time.time()
+            try:
+                operation()
+            except Exception as e:
+                errors += 1
+                first_error = first_error or '%s: %s' % (type(e).__name__, e)
+            latencies.append((time.time() - call_started) * 1000)
+        for service, (calls, ms) in stats.rpcs.items():
+            totals = rpcs.setdefault(service, {'calls': 0, 'ms': 0.0})
+            totals['calls'] += calls
+            totals['ms'] += ms
+        entities_read += stats.entities_read
+        entities_written += stats.entities_written
+    elapsed = time.time() - started
+
+    latencies.sort()
+    return {
+        'calls': iterations,
+        'errors': errors,
+        'firstError': first_error,
+        'overBudget': over_budget() - over_budget_before,
+        'throughput': iterations / elapsed if elapsed else None,
+        'latencyMs': {
+            'p50': _percentile(latencies, 0.5),
+            'p90': _percentile(latencies, 0.9),
+            'p99': _percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else None,
+        },
+        'rpcsPerCall': dict(
+            (service, {'calls': totals['calls'] / float(iterations),
+                       'ms': totals['ms'] / iterations})
+            for service, totals in sorted(rpcs.items())),
+        'entitiesReadPerCall': entities_read / float(iterations),
+        'entitiesWrittenPerCall': entities_written / float(iterations),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--conferences', type=int, default=1000)
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--speakers', type=int, default=500)
+    parser.add_argument('--profiles', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=50,
+                        help='calls per scenario')
+    parser.add_argument('--only', action='append',
+                        help='run only the named scenario; repeatable')
+    parser.add_argument('--mapper', action='append',
+                        help='also dry-run the named mapper over the '
+                             'seeded data; repeatable')
+    parser.add_argument('--registrants', type=int, default=300,
+                        help='users registering for one conference at '
+                             'once; 0 to skip')
+    parser.add_argument('--seats', type=int, default=100,
+                        help='seats of the conference they register for')
+    parser.add_argument('--query-sessions', type=int, default=1000,
+                        help='sessions of the conference whose querySession '
+                             'RPCs are checked; 0 to skip')
+    parser.add_argument('--serialize', type=int, default=10000,
+                        help='entities of each model copied to forms by '
+                             'the serializers; 0 to skip')
+    parser.add_argument('--rpc-latency-ms', type=float, default=0,
+                        help='latency of each datastore & memcache RPC')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    bed = _activateTestbed(args.rpc_latency_ms)
+    try:
+        seed_started = time.time()
+        keys = seed(args, rnd)
+        seed_seconds = time.time() - seed_started
+
+        results = {}
+        for name, operation in scenarios(keys, rnd):
+            if args.only and name not in args.only:
+                continue
+            results[name] = measure(operation, args.iterations)
+            latency = results[name]['latencyMs']
+            print('%-36s p50 %8.1fms  p99 %8.1fms  rpcs/call %6.1f%s%s' % (
+                name, latency['p50'], latency['p99'],
+                sum(rpc['calls']
+                    for rpc in results[name]['rpcsPerCall'].values()),
+                '  errors %d (%s)' % (results[name]['errors'],
+                                      results[name]['firstError'])
+                if results[name]['errors'] else '',
+                '  over RPC budget %d' % results[name]['overBudget']
+                if results[name]['overBudget'] else ''))
+
+        import mapper
+        mappers = {}
+        for name in args.mapper or []:
+            mappers[name] = mapper.runLocal(name, dry_run=True)
+            print('mapper %-29s %8.1f entities/s' % (
+                name, mappers[name]['entitiesPerSecond'] or 0))
+
+        registration_load = None
+        if args.registrants:
+            registration_load = registrationLoad(args.registrants,
+                                                 args.seats)
+            print('registration load %d registrants, %d seats: %s' % (
+                args.registrants, args.seats,
+                json.dumps(registration_load['outcomes'], sort_keys=True)))
+
+        serialization = None
+        if args.serialize:
+            serialization = serializationBenchmark(args.serialize, rnd)
+            for name, timing in sorted(serialization.items()):
+                print('serialize %-30s %8.1fus/entity' % (
+                    name, timing['microsecondsPerEntity']))
+
+        query_session_rpcs = None
+        if args.query_sessions:
+            query_session_rpcs = querySessionRpcs(args.query_sessions)
+            print('querySession %d sessions: %s' % (
+                args.query_sessions,
+                json.dumps(query_session_rpcs, sort_keys=True)))
+    finally:
+        bed.deactivate()
+
+    # every endpoint & handler call counts, including those of the
+    # registration load and the querySession check
+    from instrumentation import ENDPOINT_STATS
+    over_budget = dict((name, stats['overBudget'])
+                       for name, stats in ENDPOINT_STATS.items()
+                       if stats['overBudget'])
+
+    report = {
+        'config': vars(args),
+        'startedAt': datetime.datetime.utcnow().isoformat(),
+        'seedSeconds': seed_seconds,
+        'results': results,
+        'mappers': mappers,
+        'registrationLoad': registration_load,
+        'querySessionRpcs': query_session_rpcs,
+        'serialization': serialization,
+        'overBudget': over_budget,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    if over_budget:
+        sys.exit('Calls went over their RPC budget: %s' % ', '.join(
+            '%s %d' % item for item in sorted(over_budget.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,31 +13,58 @@ created by wesc on 2014 apr 21
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
 
+import hashlib
+import itertools
+import json
+import operator
+import random
 from datetime import datetime
 from datetime import time
 
 import endpoints
 from protorpc import messages
 from protorpc import message_types
+from protorpc import protojson
 from protorpc import remote
 
 from google.appengine.api import memcache
 from google.appengine.api import taskqueue
 from google.appengine.ext import ndb
 from google.appengine.ext import db
+from google.appengine.datastore.datastore_query import Cursor
 
+from models import AgendaSnapshot
+from models import AgendaImportForm
 from models import ConflictException
 from models import Profile
 from models import ProfileMiniForm
 from models import ProfileForm
 from models import StringMessage
 from models import BooleanMessage
+from models import AttendeeForm
+from models import AttendeeForms
+from models import CacheStatsForm
+from models import CacheStatsForms
+from models import EndpointStatsForm
+from models import EndpointStatsForms
+from models import RpcStatsForm
 from models import Conference
 from models import ConferenceForm
+from models import ConferenceFeaturedSpeakersForm
+from models import ConferenceFeaturedSpeakersForms
 from models import ConferenceForms
 from models import ConferenceQueryForm
 from models import ConferenceQueryForms
+from models import ConferenceSummaryForm
+from models import ConferenceSummaryForms
+from models import NearlySoldOut
+from models import SeatShard
+from models import SeatReservation
+from models import FeaturedSpeakerForm
 from models import TeeShirtSize
+from models import WishlistEntry
+from models import WishlistUpdateForm
+from models import WishlistUpdateResultForm
 from models import Session
 from models import SessionForm
 from models import SessionForms
@@ -47,18 +74,41 @@ from models import Speaker
 from models import SpeakerForm
 from models import SpeakerForms
 from models import SpeakerMiniForm
+from models import SpeakerSessionCount
+from models import SpeakerSummaryForm
+from models import SpeakerSummaryForms
 
+from instrumentation import ENDPOINT_STATS
+from instrumentation import instrumented
+
+from serializers import CONFERENCE_SERIALIZER
+from serializers import PROFILE_SERIALIZER
+from serializers import SESSION_SERIALIZER
+from serializers import SPEAKER_SERIALIZER
+
+from settings import ADMIN_EMAILS
 from settings import WEB_CLIENT_ID
 from settings import ANDROID_CLIENT_ID
 from settings import IOS_CLIENT_ID
 from settings import ANDROID_AUDIENCE
 
+from utils import CACHE_STATS
 from utils import getUserId
+from utils import logDebug
+from utils import recordCacheLookup
 
 EMAIL_SCOPE = endpoints.EMAIL_SCOPE
 API_EXPLORER_CLIENT_ID = endpoints.API_EXPLORER_CLIENT_ID
 MEMCACHE_ANNOUNCEMENTS_KEY = "RECENT_ANNOUNCEMENTS"
 MEMCACHE_FEATURED_SPEAKERS_KEY = "FEATURED_SPEAKERS"
+MEMCACHE_CONF_FEATURED_SPEAKERS_PREFIX = "FEATURED_SPEAKERS:"
+MEMCACHE_CAS_RETRIES = 10
+MEMCACHE_AGENDA_KEY = "AGENDA_SNAPSHOT:%s"
+MEMCACHE_CONF_GENERATION_KEY = "CONFERENCE_GENERATION"
+MEMCACHE_CONF_QUERY_PREFIX = "CONFERENCE_QUERY:"
+CONF_QUERY_CACHE_TTL = 60  # seconds
+NEARLY_SOLD_OUT_ID = "conferences"
+NEARLY_SOLD_OUT_SEATS = 5
 ANNOUNCEMENT_TPL = ('Last chance to attend! The following conferences '
                     'are nearly sold out: %s')
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -70,6 +120,29 @@ DEFAULTS = {
     "topics": ["Default", "Topic"],
 }
 
+# seats are spread over shards so registrations don't contend on one
+# entity group; an xg transaction may touch at most 25 entity groups
+SEAT_SHARDS = 20
+
+# entities written per put_multi/transaction by bulk imports
+IMPORT_BATCH_SIZE = 100
+
+# sessions added or removed per updateWishlist call
+WISHLIST_BATCH_SIZE = 100
+
+# sessions updated per speaker rename task
+SPEAKER_RENAME_BATCH_SIZE = 100
+
+# agendas serialized to more bytes than this are served from the live
+# query; entities and memcache values are limited to 1MB
+AGENDA_SNAPSHOT_MAX_BYTES = 900000
+
+# builds of one agenda snapshot a rebuild task tries before giving up
+AGENDA_BUILD_RETRIES = 3
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 OPERATORS = {
     'EQ':   '=',
     'GT':   '>',
@@ -89,6 +162,16 @@ FIELDS = {
 SESSION_FIELDS = {
     "DURATION": "duration",
     "START_TIME": "start_time",
+    "TYPE": "session_type",
+}
+
+PY_OPERATORS = {
+    '=': operator.eq,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '!=': operator.ne,
 }
 
 CONF_GET_REQUEST = endpoints.ResourceContainer(
@@ -96,6 +179,19 @@ CONF_GET_REQUEST = endpoints.ResourceContainer(
     websafeConferenceKey=messages.StringField(1),
 )
 
+PAGE_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    pageSize=messages.IntegerField(1),
+    pageToken=messages.StringField(2),
+)
+
+CONF_ATTENDEES_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    pageSize=messages.IntegerField(2),
+    pageToken=messages.StringField(3),
+)
+
 CONF_POST_REQUEST = endpoints.ResourceContainer(
     ConferenceForm,
     websafeConferenceKey=messages.StringField(1),
@@ -109,6 +205,7 @@ SESSION_CREATE_REQUEST = endpoints.ResourceContainer(
 CONF_SESSION_GET_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeConferenceKey=messages.StringField(1),
+    etag=messages.StringField(2),
 )
 
 CONF_SESSION_TYPE_GET_REQUEST = endpoints.ResourceContainer(
@@ -117,9 +214,23 @@ CONF_SESSION_TYPE_GET_REQUEST = endpoints.ResourceContainer(
     session_type=messages.StringField(2),
 )
 
+AGENDA_IMPORT_REQUEST = endpoints.ResourceContainer(
+    AgendaImportForm,
+    websafeConferenceKey=messages.StringField(1),
+)
+
 SESSION_SPEAKER_GET_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     speaker_name=messages.StringField(1),
+    pageSize=messages.IntegerField(2),
+    pageToken=messages.StringField(3),
+)
+
+SPEAKER_SESSIONS_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeSpeakerKey=messages.StringField(1),
+    pageSize=messages.IntegerField(2),
+    pageToken=messages.StringField(3),
 )
 
 CONF_SESSION_QUERY_GET_REQUEST = endpoints.ResourceContainer(
@@ -127,6 +238,11 @@ CONF_SESSION_QUERY_GET_REQUEST = endpoints.ResourceContainer(
     websafeConferenceKey=messages.StringField(1),
 )
 
+CONFS_FEATURED_SPEAKERS_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKeys=messages.StringField(1, repeated=True),
+)
+
 SESSION_GET_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeSessionKey=messages.StringField(1),
@@ -137,6 +253,13 @@ SPEAKER_GET_REQUEST = endpoints.ResourceContainer(
     websafeSpeakerKey=messages.StringField(1),
 )
 
+SPEAKER_SEARCH_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    prefix=messages.StringField(1),
+    pageSize=messages.IntegerField(2),
+    pageToken=messages.StringField(3),
+)
+
 SPEAKER_POST_REQUEST = endpoints.ResourceContainer(
     SpeakerMiniForm,
     websafeSpeakerKey=messages.StringField(1),
@@ -152,23 +275,18 @@ SPEAKER_POST_REQUEST = endpoints.ResourceContainer(
 class ConferenceApi(remote.Service):
     """Conference API v0.1"""
 
+    def __init__(self):
+        super(ConferenceApi, self).__init__()
+        # a new service instance is created for every request
+        self._profiles = {}
+
 # - - - Conference objects - - - - - - - - - - - - - - - - -
 
     def _copyConferenceToForm(self, conf, displayName):
         """Copy relevant fields from Conference to ConferenceForm."""
-        cf = ConferenceForm()
-        for field in cf.all_fields():
-            if hasattr(conf, field.name):
-                # convert Date to date string; just copy others
-                if field.name.endswith('Date'):
-                    setattr(cf, field.name, str(getattr(conf, field.name)))
-                else:
-                    setattr(cf, field.name, getattr(conf, field.name))
-            elif field.name == "websafeKey":
-                setattr(cf, field.name, conf.key.urlsafe())
+        cf = CONFERENCE_SERIALIZER.serialize(conf)
         if displayName:
-            setattr(cf, 'organizerDisplayName', displayName)
-        cf.check_initialized()
+            cf.organizerDisplayName = displayName
         return cf
 
     def _createConferenceObject(self, request):
@@ -223,12 +341,13 @@ class ConferenceApi(remote.Service):
         # create Conference, send email to organizer confirming
         # creation of Conference & return (modified) ConferenceForm
         Conference(**data).put()
+        self._bumpConferenceGeneration()
         taskqueue.add(params={'email': user.email(),
                               'conferenceInfo': repr(request)},
                       url='/tasks/send_confirmation_email')
         return request
 
-    @ndb.transactional()
+    @ndb.transactional(xg=True)
     def _updateConferenceObject(self, request):
         user = endpoints.get_current_user()
         if not user:
@@ -253,10 +372,23 @@ class ConferenceApi(remote.Service):
             raise endpoints.ForbiddenException(
                 'Only the owner can update the conference.')
 
+        # once seats are sharded, seatsAvailable is owned by the shards;
+        # a new maxAttendees is applied to them as a change in seats
+        if conf.seatShards:
+            if request.seatsAvailable not in (None, conf.seatsAvailable):
+                raise endpoints.BadRequestException(
+                    "'seatsAvailable' can't be set once attendees have "
+                    "registered; update 'maxAttendees' instead")
+            if request.maxAttendees not in (None, conf.maxAttendees):
+                conf.seatsAvailable = self._resizeSeatShards(
+                    conf, request.maxAttendees - conf.maxAttendees)
+
         # Not getting all the fields, so don't create a new object; just
         # copy relevant fields from ConferenceForm to Conference object
         for field in request.all_fields():
             data = getattr(request, field.name)
+            if field.name == 'seatsAvailable' and conf.seatShards:
+                continue
             # only copy fields where we get data
             if data not in (None, []):
                 # special handling for dates (convert string to Date)
@@ -267,39 +399,52 @@ class ConferenceApi(remote.Service):
                 # write to Conference object
                 setattr(conf, field.name, data)
         conf.put()
-        prof = ndb.Key(Profile, user_id).get()
+        prof = self._getProfile(user_id)
         return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
 
+    @instrumented
     @endpoints.method(ConferenceForm, ConferenceForm, path='conference',
                       http_method='POST', name='createConference')
     def createConference(self, request):
         """Create new conference."""
         return self._createConferenceObject(request)
 
+    @instrumented
     @endpoints.method(CONF_POST_REQUEST, ConferenceForm,
                       path='conference/{websafeConferenceKey}',
                       http_method='PUT', name='updateConference')
     def updateConference(self, request):
         """Update conference w/provided fields & return w/updated info."""
-        return self._updateConferenceObject(request)
+        conference_form = self._updateConferenceObject(request)
+        self._bumpConferenceGeneration()
+        return conference_form
 
+    @instrumented
     @endpoints.method(CONF_GET_REQUEST, ConferenceForm,
                       path='conference/{websafeConferenceKey}',
                       http_method='GET', name='getConference')
     def getConference(self, request):
         """Return requested conference (by websafeConferenceKey)."""
         # get Conference object from request; bail if not found
+        # the organizer is the key's parent, so fetch both concurrently;
+        # ndb batches their memcache & datastore reads together
         try:
-            conf = ndb.Key(urlsafe=request.websafeConferenceKey).get()
+            conf_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+            conf_future = conf_key.get_async()
+            prof_future = self._getProfileAsync(conf_key.parent().id())
+            conf = conf_future.get_result()
+            prof = prof_future.get_result()
         except db.BadRequestError:
+            conf = None
+        if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s'
                 % request.websafeConferenceKey)
 
-        prof = conf.key.parent().get()
         # return ConferenceForm
         return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
 
+    @instrumented
     @endpoints.method(message_types.VoidMessage, ConferenceForms,
                       path='getConferencesCreated',
                       http_method='POST', name='getConferencesCreated')
@@ -311,9 +456,12 @@ class ConferenceApi(remote.Service):
             raise endpoints.UnauthorizedException('Authorization required')
         user_id = getUserId(user)
 
-        # create ancestor query for all key matches for this user
-        confs = Conference.query(ancestor=ndb.Key(Profile, user_id))
-        prof = ndb.Key(Profile, user_id).get()
+        # create ancestor query for all key matches for this user;
+        # get the Profile while the query runs
+        confs_future = Conference.query(
+            ancestor=ndb.Key(Profile, user_id)).fetch_async()
+        prof = self._getProfile(user_id)
+        confs = confs_future.get_result()
         # return set of ConferenceForm objects per Conference
         return ConferenceForms(
             items=[self._copyConferenceToForm(
@@ -322,8 +470,11 @@ class ConferenceApi(remote.Service):
 
     def _getQuery(self, request):
         """Return formatted query from the submitted filters."""
+        return self._buildQuery(*self._formatFilters(request.filters))
+
+    def _buildQuery(self, inequality_filter, filters):
+        """Return query from filters formatted by _formatFilters()."""
         q = Conference.query()
-        inequality_filter, filters = self._formatFilters(request.filters)
 
         # If exists, sort on inequality filter first
         if not inequality_filter:
@@ -333,8 +484,6 @@ class ConferenceApi(remote.Service):
             q = q.order(Conference.name)
 
         for filtr in filters:
-            if filtr["field"] in ["month", "maxAttendees"]:
-                filtr["value"] = int(filtr["value"])
             formatted_query = ndb.query.FilterNode(
                 filtr["field"], filtr["operator"], filtr["value"])
             q = q.filter(formatted_query)
@@ -356,6 +505,14 @@ class ConferenceApi(remote.Service):
                 raise endpoints.BadRequestException(
                     "Filter contains invalid field or operator.")
 
+            if filtr["field"] in ["month", "maxAttendees"]:
+                try:
+                    filtr["value"] = int(filtr["value"])
+                except (TypeError, ValueError):
+                    raise endpoints.BadRequestException(
+                        "Filter contains invalid value for %s."
+                        % filtr["field"])
+
             # Every operation except "=" is an inequality
             if filtr["operator"] != "=":
                 # check if inequality operation has been used in previous
@@ -371,51 +528,208 @@ class ConferenceApi(remote.Service):
             formatted_filters.append(filtr)
         return (inequality_field, formatted_filters)
 
-    @endpoints.method(ConferenceQueryForms, ConferenceForms,
-                      path='queryConferences',
-                      http_method='POST',
-                      name='queryConferences')
-    def queryConferences(self, request):
-        """Query for conferences."""
-        conferences = self._getQuery(request)
+    def _pageSize(self, page_size):
+        """Return requested page size, defaulted and capped."""
+        page_size = min(page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        if page_size < 1:
+            raise endpoints.BadRequestException(
+                "Page size must be a positive number.")
+        return page_size
 
+    def _fetchPage(self, query, page_size, page_token, **options):
+        """Run query once for a single page of results; options such as
+        projection are passed on to fetch_page().
+
+        Return (entities, nextPageToken); the token is None on the last page.
+        """
+        return self._fetchPageAsync(query, page_size, page_token,
+                                    **options).get_result()
+
+    @ndb.tasklet
+    def _fetchPageAsync(self, query, page_size, page_token, **options):
+        """Tasklet version of _fetchPage; the query is sent as soon as it
+        is called, so other reads can be made while it runs."""
+        page_size = self._pageSize(page_size)
+        try:
+            cursor = Cursor(urlsafe=page_token) if page_token else None
+            entities, next_cursor, more = yield query.fetch_page_async(
+                page_size, start_cursor=cursor, **options)
+        except (db.BadValueError, db.BadRequestError):
+            raise endpoints.BadRequestException(
+                "Invalid page token: %s" % page_token)
+        next_page_token = None
+        if more and next_cursor:
+            next_page_token = next_cursor.urlsafe()
+        raise ndb.Return(entities, next_page_token)
+
+    @ndb.tasklet
+    def _getConferenceWithOrganizerAsync(self, conf_key):
+        """Tasklet returning (Conference, organizer displayName); gets from
+        concurrent calls are batched by ndb."""
+        conf = yield conf_key.get_async()
+        if not conf:
+            raise ndb.Return(None, None)
+        prof = yield ndb.Key(Profile, conf.organizerUserId).get_async()
+        raise ndb.Return(conf, getattr(prof, 'displayName', None))
+
+    def _getOrganizerNames(self, conferences):
+        """Return dict of organizer user id to displayName for conferences."""
         # need to fetch organiser displayName from profiles
-        # get all keys and use get_multi for speed
-        organisers = [(ndb.Key(Profile, conf.organizerUserId))
-                      for conf in conferences]
-        profiles = ndb.get_multi(organisers)
+        # get all distinct keys and use get_multi for speed
+        organiser_ids = set(conf.organizerUserId for conf in conferences)
+        profiles = ndb.get_multi([ndb.Key(Profile, user_id)
+                                  for user_id in organiser_ids])
 
         # put display names in a dict for easier fetching
         names = {}
         for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+            if profile:
+                names[profile.key.id()] = profile.displayName
+        return names
+
+    @instrumented
+    @endpoints.method(ConferenceQueryForms, ConferenceForms,
+                      path='queryConferences',
+                      http_method='POST',
+                      name='queryConferences')
+    def queryConferences(self, request):
+        """Query for conferences, one page at a time.
+
+        Pages are cached briefly as key lists, keyed by the normalized
+        filters and the conference generation.
+        """
+        inequality_filter, filters = self._formatFilters(request.filters)
+        page_size = self._pageSize(request.pageSize)
+        cache_key = self._conferenceQueryCacheKey(filters, page_size,
+                                                  request.pageToken)
+        cached = memcache.get(cache_key)
+        recordCacheLookup('conference_query', cached is not None)
+        if cached is None:
+            conferences, next_page_token = self._fetchPage(
+                self._buildQuery(inequality_filter, filters),
+                page_size, request.pageToken)
+            memcache.set(cache_key,
+                         ([conf.key for conf in conferences],
+                          next_page_token),
+                         time=CONF_QUERY_CACHE_TTL)
+        else:
+            conf_keys, next_page_token = cached
+            conferences = [conf for conf in ndb.get_multi(conf_keys) if conf]
+        logDebug('queryConferences.run', filters=len(request.filters),
+                 returned=len(conferences), cached=cached is not None,
+                 more=next_page_token is not None)
+        names = self._getOrganizerNames(conferences)
 
         # return individual ConferenceForm object per Conference
         return ConferenceForms(
             items=[self._copyConferenceToForm(
-                conf, names[conf.organizerUserId]) for conf in conferences])
+                conf, names.get(conf.organizerUserId))
+                for conf in conferences],
+            nextPageToken=next_page_token)
+
+    @staticmethod
+    def _getConferenceGeneration():
+        """Return the generation number of the Conference kind, which
+        changes whenever a conference is created or updated."""
+        generation = memcache.get(MEMCACHE_CONF_GENERATION_KEY)
+        if generation is None:
+            # start from the clock so an evicted counter never goes back
+            # to a generation that cached pages were stored under
+            generation = int((datetime.utcnow() -
+                              datetime(1970, 1, 1)).total_seconds())
+            if not memcache.add(MEMCACHE_CONF_GENERATION_KEY, generation):
+                generation = memcache.get(MEMCACHE_CONF_GENERATION_KEY)
+        return generation
+
+    @staticmethod
+    def _bumpConferenceGeneration():
+        """Invalidate every cached queryConferences page."""
+        memcache.incr(MEMCACHE_CONF_GENERATION_KEY)
+
+    def _conferenceQueryCacheKey(self, filters, page_size, page_token):
+        """Return memcache key of a queryConferences page."""
+        canonical = json.dumps([
+            sorted((filtr["field"], filtr["operator"], filtr["value"])
+                   for filtr in filters),
+            page_size, page_token, self._getConferenceGeneration()])
+        return (MEMCACHE_CONF_QUERY_PREFIX +
+                hashlib.md5(canonical).hexdigest())
+
+    @instrumented
+    @endpoints.method(ConferenceQueryForms, ConferenceSummaryForms,
+                      path='queryConferenceSummaries',
+                      http_method='POST',
+                      name='queryConferenceSummaries')
+    def queryConferenceSummaries(self, request):
+        """Query for conference names & keys, one page at a time."""
+        # a projection on name is served by the same indexes as the
+        # name-ordered full query, without loading whole entities
+        conferences, next_page_token = self._fetchPage(
+            self._getQuery(request), request.pageSize, request.pageToken,
+            projection=[Conference.name])
+
+        return ConferenceSummaryForms(
+            items=[ConferenceSummaryForm(name=conf.name,
+                                         websafeKey=conf.key.urlsafe())
+                   for conf in conferences],
+            nextPageToken=next_page_token)
 
 # - - - Profile objects - - - - - - - - - - - - - - - - - - -
 
     def _copyProfileToForm(self, prof):
         """Copy relevant fields from Profile to ProfileForm."""
-        # copy relevant fields from Profile to ProfileForm
-        pf = ProfileForm()
-        for field in pf.all_fields():
-            if hasattr(prof, field.name):
-                # convert t-shirt string to Enum; just copy others
-                if field.name == 'teeShirtSize':
-                    setattr(pf, field.name, getattr(
-                        TeeShirtSize, getattr(prof, field.name)))
-                elif field.name == "sessionKeysWishlist":
-                    all_keys = []
-                    for each_key in prof.sessionKeysWishlist:
-                        all_keys.append(each_key.urlsafe())
-                    setattr(pf, field.name, all_keys)
-                else:
-                    setattr(pf, field.name, getattr(prof, field.name))
-        pf.check_initialized()
-        return pf
+        # registrations are SeatReservations named '<wsck>:<userId>' and
+        # wishlist entries are Profile children named by websafe Session
+        # key; both keys-only queries run concurrently
+        reservation_keys = SeatReservation.query(
+            SeatReservation.userId == prof.key.id()).fetch_async(
+                keys_only=True)
+        entry_keys = WishlistEntry.query(ancestor=prof.key).order(
+            WishlistEntry.added).fetch_async(keys_only=True)
+        return PROFILE_SERIALIZER.serialize(
+            prof,
+            conferenceKeysToAttend=(
+                prof.conferenceKeysToAttend +
+                [reservation_key.id().split(':', 1)[0]
+                 for reservation_key in reservation_keys.get_result()]),
+            sessionKeysWishlist=(
+                [session_key.urlsafe()
+                 for session_key in prof.sessionKeysWishlist] +
+                [entry_key.id() for entry_key in entry_keys.get_result()]))
+
+    def _getProfile(self, user_id):
+        """Return Profile for user_id, or None if there is none.
+
+        Profiles are memoized for the request; below that, ndb's context
+        cache & memcache serve them.
+        """
+        return self._getProfileAsync(user_id).get_result()
+
+    @ndb.tasklet
+    def _getProfileAsync(self, user_id):
+        """Tasklet version of _getProfile; reads inside a transaction
+        always go to the datastore."""
+        if ndb.in_transaction():
+            profile = yield ndb.Key(Profile, user_id).get_async()
+            raise ndb.Return(profile)
+
+        profile = self._profiles.get(user_id)
+        recordCacheLookup('profile', profile is not None)
+        if not profile:
+            profile = yield ndb.Key(Profile, user_id).get_async()
+            if profile:
+                self._profiles[user_id] = profile
+        raise ndb.Return(profile)
+
+    def _invalidateProfile(self, user_id):
+        """Drop the memoized Profile after it has been written; ndb keeps
+        its own caches coherent."""
+        self._profiles.pop(user_id, None)
+
+    def _putProfile(self, prof):
+        """Write Profile to the datastore, keeping the caches coherent."""
+        prof.put()
+        self._invalidateProfile(prof.key.id())
 
     def _getProfileFromUser(self):
         """Return user Profile from datastore,
@@ -427,17 +741,16 @@ class ConferenceApi(remote.Service):
 
         # get Profile from datastore
         user_id = getUserId(user)
-        p_key = ndb.Key(Profile, user_id)
-        profile = p_key.get()
+        profile = self._getProfile(user_id)
         # create new Profile if not there
         if not profile:
             profile = Profile(
-                key=p_key,
+                key=ndb.Key(Profile, user_id),
                 displayName=user.nickname(),
                 mainEmail=user.email(),
                 teeShirtSize=str(TeeShirtSize.NOT_SPECIFIED),
             )
-            profile.put()
+            self._putProfile(profile)
 
         return profile      # return Profile
 
@@ -448,86 +761,407 @@ class ConferenceApi(remote.Service):
 
         # if saveProfile(), process user-modifyable fields
         if save_request:
+            modified = False
             for field in ('displayName', 'teeShirtSize'):
                 if hasattr(save_request, field):
                     val = getattr(save_request, field)
                     if val:
                         setattr(prof, field, str(val))
-                        prof.put()
+                        modified = True
+            if modified:
+                self._putProfile(prof)
 
         # return ProfileForm
         return self._copyProfileToForm(prof)
 
+    @instrumented
     @endpoints.method(message_types.VoidMessage, ProfileForm,
                       path='profile', http_method='GET', name='getProfile')
     def getProfile(self, request):
         """Return user profile."""
         return self._doProfile()
 
+    @instrumented
     @endpoints.method(ProfileMiniForm, ProfileForm,
                       path='profile', http_method='POST', name='saveProfile')
     def saveProfile(self, request):
         """Update & return user profile."""
         return self._doProfile(request)
 
+    @instrumented
+    @endpoints.method(message_types.VoidMessage, CacheStatsForms,
+                      path='cacheStats', http_method='GET',
+                      name='getCacheStats')
+    def getCacheStats(self, request):
+        """Return hit/miss counters of this instance's caches (admins
+        only)."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        if user.email() not in ADMIN_EMAILS:
+            raise endpoints.ForbiddenException('Admins only')
+        return CacheStatsForms(
+            items=[CacheStatsForm(name=name, hits=stats['hits'],
+                                  misses=stats['misses'])
+                   for name, stats in sorted(CACHE_STATS.items())])
+
+    @instrumented
+    @endpoints.method(message_types.VoidMessage, EndpointStatsForms,
+                      path='endpointStats', http_method='GET',
+                      name='getEndpointStats')
+    def getEndpointStats(self, request):
+        """Return this instance's latency & RPC counters per endpoint and
+        task handler (admins only)."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        if user.email() not in ADMIN_EMAILS:
+            raise endpoints.ForbiddenException('Admins only')
+        return EndpointStatsForms(
+            items=[EndpointStatsForm(
+                name=name, calls=stats['calls'], errors=stats['errors'],
+                totalMs=stats['totalMs'], maxMs=stats['maxMs'],
+                entitiesRead=stats['entitiesRead'],
+                entitiesWritten=stats['entitiesWritten'],
+                responseBytes=stats['responseBytes'],
+                responseSamples=stats['responseSamples'],
+                overBudget=stats['overBudget'],
+                rpcs=[RpcStatsForm(service=service, calls=rpc['calls'],
+                                   totalMs=rpc['totalMs'])
+                      for service, rpc in sorted(stats['rpcs'].items())])
+                for name, stats in sorted(ENDPOINT_STATS.items())])
+
 # - - - Announcements - - - - - - - - - - - - - - - - - - - -
 
     @staticmethod
     def _cacheAnnouncement():
         """Create Announcement & assign to memcache; used by
         memcache cron job & putAnnouncement().
+
+        Registrations keep the nearly sold out set current as they go, so
+        this only reconciles it with the reconciled seat counts.
         """
         confs = Conference.query(ndb.AND(
-            Conference.seatsAvailable <= 5,
+            Conference.seatsAvailable <= NEARLY_SOLD_OUT_SEATS,
             Conference.seatsAvailable > 0)
         ).fetch(projection=[Conference.name])
 
-        if confs:
+        conferences = dict((conf.key.urlsafe(), conf.name) for conf in confs)
+        ConferenceApi._storeNearlySoldOut(conferences)
+        return ConferenceApi._setAnnouncement(conferences.values())
+
+    @staticmethod
+    def _setAnnouncement(names):
+        """Format Announcement for the given conference names & assign
+        it to memcache."""
+        if names:
             # If there are almost sold out conferences,
             # format announcement and set it in memcache
-            announcement = ANNOUNCEMENT_TPL % (
-                ', '.join(conf.name for conf in confs))
-            memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, announcement)
+            announcement = ANNOUNCEMENT_TPL % (', '.join(sorted(names)))
         else:
-            # If there are no sold out conferences,
-            # delete the memcache announcements entry
+            # If there are no sold out conferences, cache an empty
+            # announcement so getAnnouncement() can tell it from an eviction
             announcement = ""
-            memcache.delete(MEMCACHE_ANNOUNCEMENTS_KEY)
-
+        memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, announcement)
         return announcement
 
+    @staticmethod
+    @ndb.transactional()
+    def _storeNearlySoldOut(conferences):
+        """Replace the nearly sold out set."""
+        key = ndb.Key(NearlySoldOut, NEARLY_SOLD_OUT_ID)
+        entity = key.get() or NearlySoldOut(key=key)
+        if (entity.conferences or {}) != conferences:
+            entity.conferences = conferences
+            entity.put()
+
+    @staticmethod
+    @ndb.transactional()
+    def _markNearlySoldOut(wsck, name, nearly_sold_out):
+        """Add or remove a Conference in the nearly sold out set.
+
+        Return the set's conference names if it changed, otherwise None.
+        """
+        key = ndb.Key(NearlySoldOut, NEARLY_SOLD_OUT_ID)
+        entity = key.get() or NearlySoldOut(key=key)
+        conferences = dict(entity.conferences or {})
+        if nearly_sold_out == (wsck in conferences):
+            return None
+        if nearly_sold_out:
+            conferences[wsck] = name
+        else:
+            del conferences[wsck]
+        entity.conferences = conferences
+        entity.put()
+        return conferences.values()
+
+    def _updateNearlySoldOut(self, conf, seats_left):
+        """Move a Conference in or out of the nearly sold out set once its
+        seat count crosses the threshold, refreshing the Announcement."""
+        names = self._markNearlySoldOut(
+            conf.key.urlsafe(), conf.name,
+            0 < seats_left <= NEARLY_SOLD_OUT_SEATS)
+        if names is not None:
+            self._setAnnouncement(names)
+
+    @instrumented
     @endpoints.method(message_types.VoidMessage, StringMessage,
                       path='conference/announcement/get',
                       http_method='GET', name='getAnnouncement')
     def getAnnouncement(self, request):
         """Return Announcement from memcache."""
-        return StringMessage(data=memcache
-                             .get(MEMCACHE_ANNOUNCEMENTS_KEY) or "")
+        announcement = memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY)
+        if announcement is None:
+            # evicted; rebuild it from the nearly sold out set
+            entity = ndb.Key(NearlySoldOut, NEARLY_SOLD_OUT_ID).get()
+            announcement = self._setAnnouncement(
+                entity.conferences.values()
+                if entity and entity.conferences else [])
+        return StringMessage(data=announcement)
 
     @staticmethod
-    def _cacheFeaturedSpeaker(session_name, speaker_name):
-        """Create Featured Speaker Announcement & assign to memcache.
+    def _cacheFeaturedSpeaker(wsck, websafe_speaker_key, speaker_name,
+                              session_name):
+        """Add speaker & session to the conference's featured speakers in
+        memcache; create Featured Speaker Announcement & assign to memcache.
         """
+        conf_key = ndb.Key(urlsafe=wsck)
+        key = MEMCACHE_CONF_FEATURED_SPEAKERS_PREFIX + conf_key.urlsafe()
+        client = memcache.Client()
+        # featured speakers of a conference are kept in one dict of
+        # websafe speaker key to speaker name & session names; compare and
+        # set so concurrent tasks don't drop each other's updates
+        for i in range(MEMCACHE_CAS_RETRIES):
+            featured = client.gets(key)
+            speakers = dict(featured or {})
+            if websafe_speaker_key in speakers:
+                name, session_names = speakers[websafe_speaker_key]
+                if session_name in session_names:
+                    break
+                session_names = session_names + [session_name]
+            else:
+                # newly featured; pick up the speaker's earlier sessions
+                speaker_key = ndb.Key(urlsafe=websafe_speaker_key)
+                speaker_sessions = Session.query(ancestor=conf_key).filter(
+                    Session.speaker_key == speaker_key)
+                session_names = [each_session.name
+                                 for each_session in speaker_sessions]
+                if session_name not in session_names:
+                    session_names.append(session_name)
+            speakers[websafe_speaker_key] = (speaker_name, session_names)
+            if featured is None:
+                stored = client.add(key, speakers)
+            else:
+                stored = client.cas(key, speakers)
+            if stored:
+                break
+
         cached_msg = "Come check out featured speaker: %s at session: %s" % (
             speaker_name, session_name,)
         memcache.set(MEMCACHE_FEATURED_SPEAKERS_KEY, cached_msg)
         return cached_msg
 
+    @staticmethod
+    def _copyFeaturedSpeakersToForm(wsck, speakers):
+        """Copy a conference's featured speakers dict from memcache to
+        ConferenceFeaturedSpeakersForm."""
+        return ConferenceFeaturedSpeakersForm(
+            websafeConferenceKey=wsck,
+            speakers=[FeaturedSpeakerForm(websafeSpeakerKey=wssk,
+                                          name=name,
+                                          sessionNames=session_names)
+                      for wssk, (name, session_names)
+                      in sorted((speakers or {}).items())])
+
+    @instrumented
     @endpoints.method(message_types.VoidMessage, StringMessage,
                       path='conference/featured_speaker/get',
                       http_method='GET', name='getFeaturedSpeaker')
     def getFeaturedSpeaker(self, request):
-        """Return Featured Speaker from memcache."""
+        """Return the most recent Featured Speaker of any conference from
+        memcache."""
         return StringMessage(data=memcache
                              .get(MEMCACHE_FEATURED_SPEAKERS_KEY) or "")
 
+    @instrumented
+    @endpoints.method(CONF_GET_REQUEST, ConferenceFeaturedSpeakersForm,
+                      path='conference/featured_speakers/'
+                           '{websafeConferenceKey}',
+                      http_method='GET',
+                      name='getConferenceFeaturedSpeakers')
+    def getConferenceFeaturedSpeakers(self, request):
+        """Return Featured Speakers of a conference from memcache."""
+        wsck = request.websafeConferenceKey
+        return self._copyFeaturedSpeakersToForm(
+            wsck,
+            memcache.get(MEMCACHE_CONF_FEATURED_SPEAKERS_PREFIX + wsck))
+
+    @instrumented
+    @endpoints.method(CONFS_FEATURED_SPEAKERS_GET_REQUEST,
+                      ConferenceFeaturedSpeakersForms,
+                      path='conferences/featured_speakers',
+                      http_method='GET',
+                      name='getFeaturedSpeakersForConferences')
+    def getFeaturedSpeakersForConferences(self, request):
+        """Return Featured Speakers of many conferences with one memcache
+        read."""
+        featured = memcache.get_multi(
+            request.websafeConferenceKeys,
+            key_prefix=MEMCACHE_CONF_FEATURED_SPEAKERS_PREFIX)
+        return ConferenceFeaturedSpeakersForms(
+            items=[self._copyFeaturedSpeakersToForm(wsck, featured.get(wsck))
+                   for wsck in request.websafeConferenceKeys])
+
 # - - - Registration - - - - - - - - - - - - - - - - - - - -
 
+    @staticmethod
+    def _seatShardKeys(conf_key, num_shards):
+        """Return the SeatShard keys of a Conference."""
+        return [ndb.Key(SeatShard, '%s:%d' % (conf_key.urlsafe(), i))
+                for i in range(num_shards)]
+
+    @staticmethod
+    @ndb.transactional(xg=True)
+    def _initSeatShards(conf_key):
+        """Split a Conference's available seats across SeatShards, once."""
+        conf = conf_key.get()
+        if not conf.seatShards:
+            seats = max(conf.seatsAvailable or 0, 0)
+            shard_keys = ConferenceApi._seatShardKeys(conf_key, SEAT_SHARDS)
+            shards = [SeatShard(key=shard_key,
+                                seats=(seats // SEAT_SHARDS +
+                                       (1 if i < seats % SEAT_SHARDS else 0)))
+                      for i, shard_key in enumerate(shard_keys)]
+            conf.seatShards = SEAT_SHARDS
+            ndb.put_multi(shards + [conf])
+        return conf
+
+    @staticmethod
+    def _resizeSeatShards(conf, delta):
+        """Add delta seats to a Conference's SeatShards, within the
+        caller's xg transaction; return the seats left.
+
+        Seats are added to the first shard and taken from any shard with
+        seats left. Raise BadRequestException if fewer seats are left than
+        are to be taken.
+        """
+        shards = ndb.get_multi(
+            ConferenceApi._seatShardKeys(conf.key, conf.seatShards))
+        seats_left = sum(shard.seats for shard in shards)
+        if seats_left + delta < 0:
+            raise endpoints.BadRequestException(
+                "'maxAttendees' can't be lower than the number of "
+                "registered attendees")
+        if delta > 0:
+            shards[0].seats += delta
+            changed = [shards[0]]
+        else:
+            changed = []
+            for shard in shards:
+                if not delta:
+                    break
+                taken = min(shard.seats, -delta)
+                if taken > 0:
+                    shard.seats -= taken
+                    delta += taken
+                    changed.append(shard)
+        ndb.put_multi(changed)
+        return sum(shard.seats for shard in shards)
+
+    @staticmethod
+    def _reservationKey(conf_key, user_id):
+        """Return the key of a user's SeatReservation for a Conference."""
+        return ndb.Key(SeatReservation,
+                       '%s:%s' % (conf_key.urlsafe(), user_id))
+
+    def _getRegistrationProfile(self):
+        """Return user Profile, first moving registrations still kept on
+        the Profile to SeatReservations."""
+        prof = self._getProfileFromUser()  # get user Profile
+        if prof.conferenceKeysToAttend:
+            ndb.put_multi(self._ledgerProfileRegistrations(prof))
+            prof = self._clearProfileRegistrations(prof.key)
+            self._invalidateProfile(prof.key.id())
+        return prof
+
+    @staticmethod
+    def _ledgerProfileRegistrations(prof, wscks=None):
+        """Return new SeatReservations for the registrations kept on a
+        Profile, or for those of them in wscks, that are not in the ledger
+        yet."""
+        if wscks is None:
+            wscks = prof.conferenceKeysToAttend
+        conf_keys = [ndb.Key(urlsafe=wsck) for wsck in wscks]
+        reservation_keys = [
+            ConferenceApi._reservationKey(conf_key, prof.key.id())
+            for conf_key in conf_keys]
+        # registrations made before seats were sharded took their seat
+        # from seatsAvailable, so they have no shard to give it back to
+        return [SeatReservation(key=reservation_key, conferenceKey=conf_key,
+                                userId=prof.key.id())
+                for conf_key, reservation_key, reservation in zip(
+                    conf_keys, reservation_keys,
+                    ndb.get_multi(reservation_keys))
+                if not reservation]
+
+    @staticmethod
+    @ndb.transactional()
+    def _clearProfileRegistrations(p_key):
+        """Drop the registrations kept on a Profile once they are ledgered."""
+        prof = p_key.get()
+        prof.conferenceKeysToAttend = []
+        prof.put()
+        return prof
+
+    @staticmethod
+    @ndb.transactional(xg=True)
+    def _reserveSeat(conf_key, user_id, shard_key):
+        """Take one seat from a shard and record it in the ledger.
+
+        Return False if the shard has run out of seats.
+        """
+        reservation_key = ConferenceApi._reservationKey(conf_key, user_id)
+        shard, reservation = ndb.get_multi([shard_key, reservation_key])
+
+        # check if user already registered otherwise add
+        if reservation:
+            raise ConflictException(
+                "You have already registered for this conference")
+
+        if shard.seats <= 0:
+            return False
+
+        # register user, take away one seat
+        shard.seats -= 1
+        reservation = SeatReservation(key=reservation_key,
+                                      conferenceKey=conf_key,
+                                      userId=user_id,
+                                      shardKey=shard_key)
+        ndb.put_multi([shard, reservation])
+        return True
+
+    @staticmethod
     @ndb.transactional(xg=True)
+    def _releaseSeat(conf_key, user_id, default_shard_key):
+        """Give a user's seat back to the shard it was taken from."""
+        reservation = ConferenceApi._reservationKey(conf_key, user_id).get()
+
+        # check if user already registered
+        if not reservation:
+            return False
+
+        # registrations made before sharding have no shard of their own
+        shard = (reservation.shardKey or default_shard_key).get()
+
+        # unregister user, add back one seat
+        shard.seats += 1
+        shard.put()
+        reservation.key.delete()
+        return True
+
     def _conferenceRegistration(self, request, reg=True):
         """Register or unregister user for selected conference."""
-        retval = None
-        prof = self._getProfileFromUser()  # get user Profile
+        prof = self._getRegistrationProfile()  # get user Profile
 
         # check if conf exists given websafeConfKey
         # get conference; check that it exists
@@ -535,68 +1169,178 @@ class ConferenceApi(remote.Service):
         try:
             conf = ndb.Key(urlsafe=wsck).get()
         except db.BadRequestError:
+            conf = None
+        if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % wsck)
 
+        if not conf.seatShards:
+            conf = self._initSeatShards(conf.key)
+        shard_keys = self._seatShardKeys(conf.key, conf.seatShards)
+        user_id = prof.key.id()
+
         # register
         if reg:
-            # check if user already registered otherwise add
-            if wsck in prof.conferenceKeysToAttend:
+            # check if user already registered
+            if self._reservationKey(conf.key, user_id).get():
                 raise ConflictException(
                     "You have already registered for this conference")
 
+            # try shards that had seats left in random order, so concurrent
+            # registrants spread across shards; a shard too contended to
+            # commit is skipped, and if every one was, the shards are read
+            # once more before giving up
+            retval = contended = False
+            for reread in (False, True):
+                shards = ndb.get_multi(shard_keys, use_cache=not reread,
+                                       use_memcache=not reread)
+                candidates = [shard.key for shard in shards
+                              if shard.seats > 0]
+                random.shuffle(candidates)
+                contended = False
+                for shard_key in candidates:
+                    try:
+                        retval = self._reserveSeat(conf.key, user_id,
+                                                   shard_key)
+                    except db.TransactionFailedError:
+                        contended = True
+                        continue
+                    if retval:
+                        break
+                if retval or not contended:
+                    break
+
             # check if seats avail
-            if conf.seatsAvailable <= 0:
+            if contended and not retval:
+                raise ConflictException(
+                    "Too many registrations at once, please try again.")
+            if not retval:
                 raise ConflictException(
                     "There are no seats available.")
 
-            # register user, take away one seat
-            prof.conferenceKeysToAttend.append(wsck)
-            conf.seatsAvailable -= 1
-            retval = True
-
         # unregister
         else:
-            # check if user already registered
-            if wsck in prof.conferenceKeysToAttend:
+            retval = self._releaseSeat(conf.key, user_id, shard_keys[0])
+
+        if retval:
+            self._scheduleSeatReconciliation(conf.key)
+            # only counts near the threshold can move a conference in or
+            # out of the nearly sold out set
+            seats_left = sum(shard.seats for shard in ndb.get_multi(
+                shard_keys, use_cache=False, use_memcache=False))
+            if seats_left <= NEARLY_SOLD_OUT_SEATS + 1:
+                self._updateNearlySoldOut(conf, seats_left)
+        return BooleanMessage(data=retval)
 
-                # unregister user, add back one seat
-                prof.conferenceKeysToAttend.remove(wsck)
-                conf.seatsAvailable += 1
-                retval = True
-            else:
-                retval = False
+    @staticmethod
+    def _scheduleSeatReconciliation(conf_key):
+        """Queue at most one seatsAvailable reconciliation per conference
+        every ten seconds."""
+        wsck = conf_key.urlsafe()
+        bucket = datetime.utcnow().strftime('%Y%m%d%H%M%S')[:-1]
+        try:
+            taskqueue.add(params={'wsck': wsck},
+                          name='reconcile-seats-%s-%s' % (wsck, bucket),
+                          countdown=10,
+                          url='/tasks/reconcile_seats')
+        except (taskqueue.TaskAlreadyExistsError,
+                taskqueue.TombstonedTaskError):
+            pass
 
-        # write things back to the datastore & return
-        prof.put()
-        conf.put()
-        return BooleanMessage(data=retval)
+    @staticmethod
+    def _reconcileSeatsAvailable(wsck):
+        """Copy the total of a Conference's SeatShards to seatsAvailable."""
+        conf_key = ndb.Key(urlsafe=wsck)
+        conf = conf_key.get()
+        if not conf or not conf.seatShards:
+            return
+        shards = ndb.get_multi(
+            ConferenceApi._seatShardKeys(conf_key, conf.seatShards))
+        ConferenceApi._storeSeatsAvailable(
+            conf_key, sum(shard.seats for shard in shards if shard))
 
-    @endpoints.method(message_types.VoidMessage, ConferenceForms,
+    @staticmethod
+    @ndb.transactional()
+    def _storeSeatsAvailable(conf_key, seats):
+        """Write a reconciled seat count to a Conference."""
+        conf = conf_key.get()
+        if conf.seatsAvailable != seats:
+            conf.seatsAvailable = seats
+            conf.put()
+
+    @instrumented
+    @endpoints.method(PAGE_GET_REQUEST, ConferenceForms,
                       path='conferences/attending',
                       http_method='GET', name='getConferencesToAttend')
     def getConferencesToAttend(self, request):
-        """Get list of conferences that user has registered for."""
-        prof = self._getProfileFromUser()  # get user Profile
-        conf_keys = [ndb.Key(urlsafe=wsck)
-                     for wsck in prof.conferenceKeysToAttend]
-        conferences = ndb.get_multi(conf_keys)
-
-        # get organizers
-        organisers = [ndb.Key(Profile, conf.organizerUserId)
-                      for conf in conferences]
-        profiles = ndb.get_multi(organisers)
+        """Get list of conferences that user has registered for,
+        one page at a time."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
 
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+        # the ledger query runs while the Profile is read
+        query = SeatReservation.query(
+            SeatReservation.userId == getUserId(user))
+        page = self._fetchPageAsync(query, request.pageSize,
+                                    request.pageToken)
+        prof = self._getProfileFromUser()  # get user Profile
+        if prof.conferenceKeysToAttend:
+            # registrations still kept on the Profile go to the ledger
+            # first, then the query is run again
+            self._getRegistrationProfile()
+            page = self._fetchPageAsync(query, request.pageSize,
+                                        request.pageToken)
+        reservations, next_page_token = page.get_result()
+        # each organizer get is issued as soon as its conference arrives
+        futures = [self._getConferenceWithOrganizerAsync(
+            reservation.conferenceKey) for reservation in reservations]
 
         # return set of ConferenceForm objects per Conference
         return ConferenceForms(
-            items=[self._copyConferenceToForm(
-                conf, names[conf.organizerUserId]) for conf in conferences])
+            items=[self._copyConferenceToForm(conf, display_name)
+                   for conf, display_name in (future.get_result()
+                                              for future in futures)
+                   if conf],
+            nextPageToken=next_page_token)
+
+    @instrumented
+    @endpoints.method(CONF_ATTENDEES_GET_REQUEST, AttendeeForms,
+                      path='conference/{websafeConferenceKey}/attendees',
+                      http_method='GET', name='getConferenceAttendees')
+    def getConferenceAttendees(self, request):
+        """Return attendees of a conference (organizer only),
+        one page at a time."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
 
+        wsck = request.websafeConferenceKey
+        try:
+            conf = ndb.Key(urlsafe=wsck).get()
+        except db.BadRequestError:
+            conf = None
+        if not conf:
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % wsck)
+        if getUserId(user) != conf.organizerUserId:
+            raise endpoints.ForbiddenException(
+                'Only the owner can list the conference attendees.')
+
+        reservations, next_page_token = self._fetchPage(
+            SeatReservation.query(SeatReservation.conferenceKey == conf.key),
+            request.pageSize, request.pageToken)
+        profiles = ndb.get_multi([ndb.Key(Profile, reservation.userId)
+                                  for reservation in reservations])
+        return AttendeeForms(
+            items=[AttendeeForm(displayName=prof.displayName,
+                                mainEmail=prof.mainEmail,
+                                registered=str(reservation.registered))
+                   for reservation, prof in zip(reservations, profiles)
+                   if prof],
+            nextPageToken=next_page_token)
+
+    @instrumented
     @endpoints.method(CONF_GET_REQUEST, BooleanMessage,
                       path='conference/{websafeConferenceKey}',
                       http_method='POST', name='registerForConference')
@@ -604,6 +1348,7 @@ class ConferenceApi(remote.Service):
         """Register user for selected conference."""
         return self._conferenceRegistration(request)
 
+    @instrumented
     @endpoints.method(CONF_GET_REQUEST, BooleanMessage,
                       path='conference/{websafeConferenceKey}',
                       http_method='DELETE', name='unregisterFromConference')
@@ -611,6 +1356,25 @@ class ConferenceApi(remote.Service):
         """Unregister user for selected conference."""
         return self._conferenceRegistration(request, reg=False)
 
+    @instrumented
+    @endpoints.method(CONF_GET_REQUEST, BooleanMessage,
+                      path='conference/{websafeConferenceKey}/registration',
+                      http_method='GET', name='isRegisteredForConference')
+    def isRegisteredForConference(self, request):
+        """Return whether user is registered for selected conference."""
+        prof = self._getRegistrationProfile()  # get user Profile
+        wsck = request.websafeConferenceKey
+        try:
+            conf_key = ndb.Key(urlsafe=wsck)
+        except db.BadRequestError:
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % wsck)
+        # a get by key is strongly consistent, unlike the ledger query
+        # behind ProfileForm.conferenceKeysToAttend
+        reservation = self._reservationKey(conf_key, prof.key.id()).get()
+        return BooleanMessage(data=reservation is not None)
+
+    @instrumented
     @endpoints.method(message_types.VoidMessage, ConferenceForms,
                       path='filterPlayground',
                       http_method='GET', name='filterPlayground')
@@ -650,46 +1414,41 @@ class ConferenceApi(remote.Service):
         Speaker(**data).put()
         return request
 
-    def _copySpeakerToForm(self, speaker):
-        """Copy relevant fields from Speaker to SpeakerForm."""
-        speaker_form = SpeakerForm()
-        for field in speaker_form.all_fields():
-            if hasattr(speaker, field.name):
-                if field.name == "sessionKeysSpeakAt":
-                    all_keys = []
-                    for each_key in speaker.sessionKeysSpeakAt:
-                        all_keys.append(each_key.urlsafe())
-                    print "%^&*(*&^%$%^&*(*&^%"
-                    print all_keys
-                    setattr(speaker_form, field.name, all_keys)
-                else:
-                    setattr(speaker_form, field.name,
-                            getattr(speaker, field.name))
-
-            elif field.name == "websafeKey":
-                setattr(speaker_form, field.name, speaker.key.urlsafe())
-        speaker_form.check_initialized()
+    def _copySpeakerToForm(self, speaker, session_keys=None):
+        """Copy relevant fields from Speaker to SpeakerForm; session keys
+        are only included when given."""
+        speaker_form = SPEAKER_SERIALIZER.serialize(speaker)
+        if session_keys is not None:
+            speaker_form.sessionKeysSpeakAt = [
+                session_key.urlsafe() for session_key in session_keys]
         return speaker_form
 
+    @instrumented
     @endpoints.method(SpeakerMiniForm, SpeakerMiniForm, path='speaker',
                       http_method='POST', name='createSpeaker')
     def createSpeaker(self, request):
         """Create new speaker"""
         return self._createSpeakerObject(request)
 
+    @instrumented
     @endpoints.method(SPEAKER_GET_REQUEST, SpeakerForm,
                       path='speaker/{websafeSpeakerKey}',
                       http_method='GET', name='getSpeaker')
     def getSpeaker(self, request):
         """Return requested speaker (by websafeSpeakerKey)."""
         try:
-            speaker = ndb.Key(urlsafe=request.websafeSpeakerKey).get()
+            speaker_key = ndb.Key(urlsafe=request.websafeSpeakerKey)
+            session_keys = Session.query(
+                Session.speaker_key == speaker_key).fetch_async(keys_only=True)
+            speaker = speaker_key.get()
         except db.BadRequestError:
+            speaker = None
+        if not speaker:
             raise endpoints.NotFoundException(
                 'No speaker found with key: %s'
                 % request.websafeSpeakerKey)
 
-        return self._copySpeakerToForm(speaker)
+        return self._copySpeakerToForm(speaker, session_keys.get_result())
 
     @ndb.transactional()
     def _updateSpeakerObject(self, request):
@@ -709,6 +1468,7 @@ class ConferenceApi(remote.Service):
             raise endpoints.NotFoundException(
                 "No speaker found with key: %s"
                 % request.websafeSpeakerKey)
+        old_name = speaker.name
 
         # Not getting all the fields, so don't create a new object; just
         # copy relevant fields from ConferenceForm to Conference object
@@ -718,9 +1478,55 @@ class ConferenceApi(remote.Service):
             if data not in (None, []):
                 # write to Speaker object
                 setattr(speaker, field.name, data)
+        renamed = speaker.name != old_name
         speaker.put()
+
+        # sessions and their agendas carry the speaker name
+        if renamed:
+            self._scheduleSpeakerRenamed(speaker.key.urlsafe(),
+                                         transactional=True)
         return self._copySpeakerToForm(speaker)
 
+    @staticmethod
+    def _scheduleSpeakerRenamed(websafe_speaker_key, cursor=None,
+                                transactional=False):
+        params = {'websafe_speaker_key': websafe_speaker_key}
+        if cursor:
+            params['cursor'] = cursor
+        taskqueue.add(params=params, url='/tasks/speaker_renamed',
+                      transactional=transactional)
+
+    @staticmethod
+    def _speakerRenamed(websafe_speaker_key, cursor=None):
+        """Copy a renamed speaker's name to one batch of their sessions,
+        rebuild those sessions' agendas and queue the next batch."""
+        speaker = ndb.Key(urlsafe=websafe_speaker_key).get()
+        if not speaker:
+            return
+        try:
+            start_cursor = Cursor(urlsafe=cursor) if cursor else None
+        except (db.BadValueError, db.BadRequestError):
+            return
+        speaker_sessions, next_cursor, more = Session.query(
+            Session.speaker_key == speaker.key).order(Session.key).fetch_page(
+                SPEAKER_RENAME_BATCH_SIZE, start_cursor=start_cursor)
+
+        # the task always copies the current name, so it is safe to retry
+        # and a later rename cannot be undone by an earlier one
+        renamed = [each_session for each_session in speaker_sessions
+                   if each_session.speaker_name != speaker.name]
+        for each_session in renamed:
+            each_session.speaker_name = speaker.name
+        ndb.put_multi(renamed)
+        ConferenceApi._scheduleAgendaRebuild(
+            set(each_session.key.parent().urlsafe()
+                for each_session in renamed))
+
+        if more and next_cursor:
+            ConferenceApi._scheduleSpeakerRenamed(websafe_speaker_key,
+                                                  next_cursor.urlsafe())
+
+    @instrumented
     @endpoints.method(SPEAKER_POST_REQUEST, SpeakerForm,
                       path='speaker/{websafeSpeakerKey}',
                       http_method='PUT', name='updateSpeaker')
@@ -728,47 +1534,85 @@ class ConferenceApi(remote.Service):
         """Update speaker"""
         return self._updateSpeakerObject(request)
 
-    @endpoints.method(message_types.VoidMessage, SpeakerForms,
+    @instrumented
+    @endpoints.method(PAGE_GET_REQUEST, SpeakerForms,
                       path='allSpeaker',
                       http_method='GET', name='getAllSpeakers')
     def getAllSpeakers(self, request):
-        all_speakers = Speaker.query()
+        """Return speakers ordered by name, one page at a time."""
+        all_speakers, next_page_token = self._fetchPage(
+            Speaker.query().order(Speaker.name),
+            request.pageSize, request.pageToken)
 
         return SpeakerForms(
-            items=[self._copySpeakerToForm(item) for item in all_speakers])
-
-    def _createSessionObject(self, request):
-        """Create Sessionobject, returning SessionForm/request."""
-        user = endpoints.get_current_user()
-        if not user:
-            raise endpoints.UnauthorizedException('Authorization required')
-        user_id = getUserId(user)
-
+            items=[self._copySpeakerToForm(item) for item in all_speakers],
+            nextPageToken=next_page_token)
+
+    @instrumented
+    @endpoints.method(SPEAKER_SEARCH_REQUEST, SpeakerSummaryForms,
+                      path='searchSpeakers',
+                      http_method='GET', name='searchSpeakers')
+    def searchSpeakers(self, request):
+        """Return names & keys of speakers whose name starts with prefix
+        (case insensitive), one page at a time."""
+        prefix = (request.prefix or '').strip().lower()
+        if not prefix:
+            raise endpoints.BadRequestException(
+                "Speaker name 'prefix' required")
+        speakers = Speaker.query(
+            Speaker.nameLower >= prefix,
+            Speaker.nameLower < prefix + u'\ufffd').order(Speaker.nameLower)
+        speakers, next_page_token = self._fetchPage(
+            speakers, request.pageSize, request.pageToken,
+            projection=[Speaker.name])
+        return SpeakerSummaryForms(
+            items=[SpeakerSummaryForm(name=speaker.name,
+                                      websafeKey=speaker.key.urlsafe())
+                   for speaker in speakers],
+            nextPageToken=next_page_token)
+
+    @instrumented
+    @endpoints.method(PAGE_GET_REQUEST, SpeakerSummaryForms,
+                      path='speakerSummaries',
+                      http_method='GET', name='getSpeakerSummaries')
+    def getSpeakerSummaries(self, request):
+        """Return speaker names & keys ordered by name, one page at a time;
+        use getSpeaker for a speaker's details."""
+        speakers, next_page_token = self._fetchPage(
+            Speaker.query().order(Speaker.name),
+            request.pageSize, request.pageToken,
+            projection=[Speaker.name])
+        return SpeakerSummaryForms(
+            items=[SpeakerSummaryForm(name=speaker.name,
+                                      websafeKey=speaker.key.urlsafe())
+                   for speaker in speakers],
+            nextPageToken=next_page_token)
+
+    def _getOwnedConference(self, wsck, user_id):
+        """Return Conference by websafe key, checking user_id organizes it."""
         # check if conference exists given websafeConferenceKey
-        wsck = request.websafeConferenceKey
         try:
             conf = ndb.Key(urlsafe=wsck).get()
         except db.BadRequestError:
+            conf = None
+        if not conf:
             raise endpoints.NotFoundException(
-                "No conference found with key: %s "
-                % request.websafeConferenceKey)
+                "No conference found with key: %s " % wsck)
 
         if user_id != conf.organizerUserId:
             raise endpoints.ForbiddenException(
                 'Only the owner can add sessions to the conference.')
-
-        data = {field.name: getattr(request, field.name)
-                for field in request.all_fields()}
-        del data['speaker_name']
-        if data['speaker_key']:
-            websafeSpeakerKey = data['speaker_key']
-            try:
-                speaker = ndb.Key(urlsafe=websafeSpeakerKey).get()
-                data['speaker_key'] = speaker.key
-            except db.BadRequestError:
-                raise endpoints.NotFoundException(
-                    "No speaker found with key: %s "
-                    % websafeSpeakerKey)
+        return conf
+
+    def _copySessionFormToData(self, session_form):
+        """Copy SessionForm fields to a dict of Session property values,
+        converting date & start_time strings; speaker_key is left as the
+        websafe key."""
+        data = {field.name: getattr(session_form, field.name)
+                for field in session_form.all_fields()}
+        for field_name in ('speaker_name', 'websafe_key',
+                           'websafeConferenceKey'):
+            data.pop(field_name, None)
 
         if data['date']:
             data['date'] = (datetime
@@ -779,52 +1623,223 @@ class ConferenceApi(remote.Service):
             formatted_time = split_time[0] + ":" + split_time[1]
             data['start_time'] = (datetime
                                   .strptime(formatted_time, "%H:%M").time())
-        c_key = ndb.Key(urlsafe=wsck)
+        return data
+
+    @staticmethod
+    def _scheduleFeaturedSpeakers(wsck, featured):
+        """Queue one featured speaker task for a conference; featured is a
+        list of (speaker, latest session name) with 2 or more sessions."""
+        if featured:
+            taskqueue.add(params={
+                'websafe_speaker_key': [speaker.key.urlsafe()
+                                        for speaker, _ in featured],
+                'speaker_name': [speaker.name for speaker, _ in featured],
+                'session_name': [session_name for _, session_name in featured],
+                'wsck': wsck},
+                url='/tasks/find_featured_speaker')
+
+    def _createSessionObject(self, request):
+        """Create Sessionobject, returning SessionForm/request."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        user_id = getUserId(user)
+
+        wsck = request.websafeConferenceKey
+        conf = self._getOwnedConference(wsck, user_id)
+
+        data = self._copySessionFormToData(request)
+        speaker = None
+        if data['speaker_key']:
+            websafeSpeakerKey = data['speaker_key']
+            try:
+                speaker = ndb.Key(urlsafe=websafeSpeakerKey).get()
+            except db.BadRequestError:
+                pass
+            if not speaker:
+                raise endpoints.NotFoundException(
+                    "No speaker found with key: %s "
+                    % websafeSpeakerKey)
+            data['speaker_key'] = speaker.key
+            data['speaker_name'] = speaker.name
+
+        c_key = conf.key
         session_id = Session.allocate_ids(size=1, parent=c_key)[0]
         session_key = ndb.Key(Session, session_id, parent=c_key)
         data['key'] = session_key
-        del data['websafe_key']
-        del data['websafeConferenceKey']
-        new_session_key = Session(**data).put()
-        new_session = new_session_key.get()
-        if speaker:
-            if new_session_key not in speaker.sessionKeysSpeakAt:
-                print "&&&&&&&&&&&&&&&" + str(new_session_key)
-                speaker.sessionKeysSpeakAt.append(new_session_key)
-                speaker.put()
-            websafe_speaker_key = speaker.key.urlsafe()
-            taskqueue.add(params={'websafe_speaker_key': websafe_speaker_key,
-                                  'wsck': wsck,
-                                  'session_name': data['name']},
-                          url='/tasks/find_featured_speaker')
+        new_session = Session(**data)
+        _, session_count = self._storeSession(new_session)
+        # a speaker with more than one session may be featured
+        if session_count >= 2:
+            self._scheduleFeaturedSpeakers(wsck, [(speaker, data['name'])])
         return self._copySessionToForm(new_session)
 
-    def _copySessionToForm(self, session_object):
-        """Copy relevant fields from Session to SessionForm."""
-        sf = SessionForm()
-        for field in sf.all_fields():
-            if hasattr(session_object, field.name):
-                # convert Date/Time to date/time string; just copy others
-                if field.name.endswith('date') or field.name == 'start_time':
-                    setattr(sf, field.name,
-                            str(getattr(session_object, field.name)))
-                elif field.name == "speaker_key":
-                    setattr(sf, field.name,
-                            session_object.speaker_key.urlsafe())
-                    speaker = session_object.speaker_key.get()
-                    setattr(sf, "speaker_name", speaker.name)
+    @ndb.transactional()
+    def _storeSessionBatch(self, sessions):
+        """Write a batch of new Sessions of one conference, count them
+        towards their speakers and queue the rebuild of the conference's
+        agenda; return the speakers' new session counts."""
+        ndb.put_multi(sessions)
+        self._scheduleAgendaRebuild([sessions[0].key.parent().urlsafe()])
+        deltas = {}
+        for each_session in sessions:
+            if each_session.speaker_key:
+                deltas[each_session.speaker_key] = (
+                    deltas.get(each_session.speaker_key, 0) + 1)
+        return self._bumpSpeakerSessionCounts(sessions[0].key.parent(),
+                                              deltas)
+
+    def _importAgenda(self, request):
+        """Create the speakers & sessions of an agenda in bulk, returning
+        SessionForms of the new sessions."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        user_id = getUserId(user)
+
+        wsck = request.websafeConferenceKey
+        conf = self._getOwnedConference(wsck, user_id)
+
+        # allocate keys for all new speakers in one range
+        new_speakers = {}  # ref -> Speaker
+        if request.speakers:
+            refs = set()
+            for agenda_speaker in request.speakers:
+                if not agenda_speaker.name:
+                    raise endpoints.BadRequestException(
+                        "Speaker 'name' field required")
+                if not agenda_speaker.ref or agenda_speaker.ref in refs:
+                    raise endpoints.BadRequestException(
+                        "Every speaker needs a unique 'ref'.")
+                refs.add(agenda_speaker.ref)
+            first, last = Speaker.allocate_ids(size=len(request.speakers))
+            for speaker_id, agenda_speaker in zip(range(first, last + 1),
+                                                  request.speakers):
+                new_speakers[agenda_speaker.ref] = Speaker(
+                    key=ndb.Key(Speaker, speaker_id),
+                    name=agenda_speaker.name,
+                    bio=agenda_speaker.bio)
+
+        # fetch existing speakers referred to by websafe key in one batch
+        existing_keys = set()
+        for agenda_session in request.sessions:
+            if not agenda_session.session or not agenda_session.session.name:
+                raise endpoints.BadRequestException(
+                    "Session 'name' field required")
+            if agenda_session.speakerRef:
+                if agenda_session.speakerRef not in new_speakers:
+                    raise endpoints.BadRequestException(
+                        "Unknown speaker ref: %s" % agenda_session.speakerRef)
+            elif agenda_session.session.speaker_key:
+                try:
+                    existing_keys.add(
+                        ndb.Key(urlsafe=agenda_session.session.speaker_key))
+                except db.BadRequestError:
+                    raise endpoints.NotFoundException(
+                        "No speaker found with key: %s"
+                        % agenda_session.session.speaker_key)
+        existing_keys = list(existing_keys)
+        existing_speakers = {}  # ndb.Key -> Speaker
+        for speaker_key, existing_speaker in zip(
+                existing_keys, ndb.get_multi(existing_keys)):
+            if not existing_speaker:
+                raise endpoints.NotFoundException(
+                    "No speaker found with key: %s" % speaker_key.urlsafe())
+            existing_speakers[speaker_key] = existing_speaker
+
+        # allocate keys for all sessions in one range
+        sessions = []
+        if request.sessions:
+            first, last = Session.allocate_ids(size=len(request.sessions),
+                                               parent=conf.key)
+            for session_id, agenda_session in zip(range(first, last + 1),
+                                                  request.sessions):
+                data = self._copySessionFormToData(agenda_session.session)
+                if agenda_session.speakerRef:
+                    speaker = new_speakers[agenda_session.speakerRef]
+                elif data['speaker_key']:
+                    # keyed by ndb.Key, so any encoding of the key matches
+                    speaker = existing_speakers[
+                        ndb.Key(urlsafe=data['speaker_key'])]
                 else:
-                    setattr(sf, field.name,
-                            getattr(session_object, field.name))
-            elif field.name == "websafe_key":
-                setattr(sf, field.name, session_object.key.urlsafe())
-        if session_object.speaker_key:
-            speaker = session_object.speaker_key.get()
-            setattr(sf, 'speaker_name', speaker.name)
+                    speaker = None
+                data['speaker_key'] = speaker.key if speaker else None
+                data['speaker_name'] = speaker.name if speaker else None
+                data['key'] = ndb.Key(Session, session_id, parent=conf.key)
+                sessions.append(Session(**data))
+
+        # write sessions in batches, each with its speakers' counters
+        session_counts = {}
+        for i in range(0, len(sessions), IMPORT_BATCH_SIZE):
+            session_counts.update(
+                self._storeSessionBatch(sessions[i:i + IMPORT_BATCH_SIZE]))
+
+        # write new speakers; sessions find their speakers through the
+        # Session.speaker_key index, so existing speakers are not rewritten
+        new_speaker_list = new_speakers.values()
+        for i in range(0, len(new_speaker_list), IMPORT_BATCH_SIZE):
+            ndb.put_multi(new_speaker_list[i:i + IMPORT_BATCH_SIZE])
+
+        speakers_by_key = dict(existing_speakers)
+        speakers_by_key.update((new_speaker.key, new_speaker)
+                               for new_speaker in new_speaker_list)
+        latest_session_names = {}
+        for each_session in sessions:
+            if each_session.speaker_key:
+                latest_session_names[each_session.speaker_key] = (
+                    each_session.name)
+
+        self._scheduleFeaturedSpeakers(
+            conf.key.urlsafe(),
+            [(featured_speaker, latest_session_names[speaker_key])
+             for speaker_key, featured_speaker in speakers_by_key.items()
+             if session_counts.get(speaker_key, 0) >= 2])
+
+        return SessionForms(
+            items=[self._copySessionToForm(each_session)
+                   for each_session in sessions])
+
+    def _copySessionToForm(self, session_object, speaker_names=None):
+        """Copy relevant fields from Session to SessionForm.
+
+        Sessions carry their speaker's name; for sessions written before
+        that, speaker_names maps speaker keys to names when the speakers
+        have already been fetched in bulk, otherwise the speaker is
+        fetched here.
+        """
+        speaker_name = session_object.speaker_name
+        if speaker_name is None and session_object.speaker_key:
+            if speaker_names is None:
+                speaker = session_object.speaker_key.get()
+                speaker_name = speaker.name if speaker else None
+            else:
+                speaker_name = speaker_names.get(session_object.speaker_key)
+        return SESSION_SERIALIZER.serialize(session_object,
+                                            speaker_name=speaker_name)
+
+    def _copySessionsToForms(self, sessions):
+        """Copy Sessions to SessionForms; only sessions written before
+        speaker names were stored on them need their speakers fetched, in
+        one batch."""
+        # get_multi() returns None for sessions that no longer exist
+        sessions = [each_session for each_session in sessions
+                    if each_session]
+
+        # get all distinct keys and use get_multi for speed
+        speaker_keys = list(set(each_session.speaker_key
+                                for each_session in sessions
+                                if each_session.speaker_key and
+                                each_session.speaker_name is None))
+        names = {}
+        for speaker in ndb.get_multi(speaker_keys):
+            if speaker:
+                names[speaker.key] = speaker.name
 
-        sf.check_initialized()
-        return sf
+        return SessionForms(
+            items=[self._copySessionToForm(each_session, names)
+                   for each_session in sessions])
 
+    @instrumented
     @endpoints.method(SESSION_CREATE_REQUEST, SessionForm,
                       path='session',
                       http_method='POST', name='createSession')
@@ -832,24 +1847,197 @@ class ConferenceApi(remote.Service):
         """Create new session in given conference"""
         return self._createSessionObject(request)
 
+    @instrumented
+    @endpoints.method(AGENDA_IMPORT_REQUEST, SessionForms,
+                      path='importAgenda',
+                      http_method='POST', name='importAgenda')
+    def importAgenda(self, request):
+        """Create the speakers & sessions of a conference's agenda at once"""
+        return self._importAgenda(request)
+
     @staticmethod
-    def _getConferenceSessions(wsck):
-        """Return sessions belong to conference(by websafeConferenceKey)."""
-        conf_sessions = Session.query(ancestor=ndb.Key(urlsafe=wsck))
+    def _speakerSessionCountKey(conf_key, speaker_key):
+        """Return key of the session counter of a speaker at a conference."""
+        return ndb.Key(SpeakerSessionCount, speaker_key.urlsafe(),
+                       parent=conf_key)
 
-        return conf_sessions
+    @staticmethod
+    def _bumpSpeakerSessionCounts(conf_key, deltas):
+        """Add deltas (speaker key -> delta) to speakers' session counters at
+        a conference, returning the new counts by speaker key; call inside
+        the transaction that writes the sessions, which shares the
+        counters' entity group."""
+        speaker_keys = deltas.keys()
+        counter_keys = [ConferenceApi._speakerSessionCountKey(
+            conf_key, speaker_key) for speaker_key in speaker_keys]
+        counters = ndb.get_multi(counter_keys)
+        counts = {}
+        for speaker_key, counter_key, counter in zip(
+                speaker_keys, counter_keys, counters):
+            if not counter:
+                counter = SpeakerSessionCount(key=counter_key)
+            counter.count = max(counter.count + deltas[speaker_key], 0)
+            counts[speaker_key] = counter
+        ndb.put_multi(counts.values())
+        return {speaker_key: counter.count
+                for speaker_key, counter in counts.items()}
+
+    @staticmethod
+    def _bumpSpeakerSessionCount(conf_key, speaker_key, delta=1):
+        """Add delta to a speaker's session counter at a conference,
+        returning the new count; see _bumpSpeakerSessionCounts."""
+        return ConferenceApi._bumpSpeakerSessionCounts(
+            conf_key, {speaker_key: delta})[speaker_key]
+
+    @ndb.transactional()
+    def _storeSession(self, session):
+        """Write a new Session, count it towards its speaker's sessions at
+        the conference and queue the rebuild of the conference's agenda;
+        return (session key, speaker's session count or 0)."""
+        session_key = session.put()
+        # queued only if the session is written, and always if it is
+        self._scheduleAgendaRebuild([session_key.parent().urlsafe()])
+        if not session.speaker_key:
+            return session_key, 0
+        return session_key, self._bumpSpeakerSessionCount(
+            session_key.parent(), session.speaker_key)
+
+    @staticmethod
+    def _getSpeakerSessionCount(wsck, websafe_speaker_key):
+        """Return number of sessions a speaker has at a conference."""
+        counter = ConferenceApi._speakerSessionCountKey(
+            ndb.Key(urlsafe=wsck), ndb.Key(urlsafe=websafe_speaker_key)).get()
+        return counter.count if counter else 0
+
+    @staticmethod
+    def _serializeAgenda(conf_key):
+        """Return (etag, payload) of a Conference's sessions."""
+        payload = protojson.encode_message(
+            ConferenceApi()._copySessionsToForms(
+                Session.query(ancestor=conf_key)))
+        return hashlib.md5(payload).hexdigest(), payload
+
+    @staticmethod
+    def _buildAgendaSnapshot(wsck, retry=False):
+        """Serialize a Conference's sessions and store them as its agenda
+        snapshot in the datastore and memcache; return (etag, payload), or
+        None if there is no such Conference.
+
+        The snapshot is stored only if no other build has stored one since
+        this one started, so a slower build never replaces a newer one;
+        with retry, a build that lost is run again. Agendas larger than
+        AGENDA_SNAPSHOT_MAX_BYTES are stored without a payload.
+        """
+        conf_key = ndb.Key(urlsafe=wsck)
+        # requests for unknown keys must not store snapshots
+        if conf_key.kind() != 'Conference' or not conf_key.get():
+            return None
+        snapshot_key = ndb.Key(AgendaSnapshot, wsck)
+        for _ in range(AGENDA_BUILD_RETRIES):
+            # the sessions are read after the version, so a snapshot stored
+            # under a later version saw every change this build saw
+            stored = snapshot_key.get(use_cache=False, use_memcache=False)
+            etag, payload = ConferenceApi._serializeAgenda(conf_key)
+            snapshot = AgendaSnapshot(
+                key=snapshot_key, etag=etag,
+                version=(stored.version if stored else 0) + 1,
+                payload=(payload if len(payload) <= AGENDA_SNAPSHOT_MAX_BYTES
+                         else None))
+            if ConferenceApi._storeAgendaSnapshot(snapshot):
+                ConferenceApi._cacheAgendaSnapshot(snapshot)
+                return etag, payload
+            if not retry:
+                return etag, payload
+        raise db.TransactionFailedError(
+            'Agenda snapshot of %s kept changing' % wsck)
+
+    @staticmethod
+    @ndb.transactional()
+    def _storeAgendaSnapshot(snapshot):
+        """Write an agenda snapshot unless another was stored after the one
+        it was built on; return whether it was written."""
+        stored = snapshot.key.get()
+        if (stored.version if stored else 0) != snapshot.version - 1:
+            return False
+        snapshot.put()
+        return True
+
+    @staticmethod
+    def _cacheAgendaSnapshot(snapshot):
+        """Put an agenda snapshot in memcache unless a later version of it
+        is there already."""
+        key = MEMCACHE_AGENDA_KEY % snapshot.key.id()
+        value = (snapshot.version, snapshot.etag, snapshot.payload)
+        client = memcache.Client()
+        for i in range(MEMCACHE_CAS_RETRIES):
+            cached = client.gets(key)
+            if cached is None:
+                stored = client.add(key, value)
+            elif cached[0] >= snapshot.version:
+                break
+            else:
+                stored = client.cas(key, value)
+            if stored:
+                break
+
+    @staticmethod
+    def _getAgendaSnapshot(wsck):
+        """Return (etag, payload) of a Conference's agenda snapshot from
+        memcache, falling back to the datastore and then to a rebuild;
+        return None if there is no such Conference."""
+        cached = memcache.get(MEMCACHE_AGENDA_KEY % wsck)
+        if cached:
+            _, etag, payload = cached
+        else:
+            snapshot = ndb.Key(AgendaSnapshot, wsck).get()
+            if not snapshot:
+                return ConferenceApi._buildAgendaSnapshot(wsck)
+            ConferenceApi._cacheAgendaSnapshot(snapshot)
+            etag, payload = snapshot.etag, snapshot.payload
+        if payload is None:
+            # too large to snapshot
+            return ConferenceApi._serializeAgenda(ndb.Key(urlsafe=wsck))
+        return etag, payload
 
+    @staticmethod
+    def _scheduleAgendaRebuild(wscks):
+        """Queue one task rebuilding the agenda snapshots of conferences."""
+        wscks = list(wscks)
+        if wscks:
+            taskqueue.add(params={'wsck': wscks},
+                          url='/tasks/rebuild_agenda',
+                          transactional=ndb.in_transaction())
+
+    @instrumented
     @endpoints.method(CONF_SESSION_GET_REQUEST, SessionForms,
                       path='getConferenceSessions',
                       http_method='GET', name='getConferenceSessions')
     def getConferenceSessions(self, request):
-        """Return sessions belong to conference(by websafeConferenceKey)."""
-        wsck = request.websafeConferenceKey
-        conf_sessions = Session.query(ancestor=ndb.Key(urlsafe=wsck))
-        return SessionForms(
-            items=[self._copySessionToForm(each_session)
-                   for each_session in conf_sessions])
+        """Return sessions belong to conference(by websafeConferenceKey).
+
+        Served from the conference's agenda snapshot; pass the etag of a
+        previous response to get notModified instead of the sessions.
+        """
+        try:
+            wsck = ndb.Key(urlsafe=request.websafeConferenceKey).urlsafe()
+        except db.BadRequestError:
+            raise endpoints.NotFoundException(
+                "No conference found with key: %s"
+                % request.websafeConferenceKey)
 
+        snapshot = self._getAgendaSnapshot(wsck)
+        if not snapshot:
+            raise endpoints.NotFoundException(
+                "No conference found with key: %s"
+                % request.websafeConferenceKey)
+        etag, payload = snapshot
+        if request.etag == etag:
+            return SessionForms(etag=etag, notModified=True)
+        conf_sessions = protojson.decode_message(SessionForms, payload)
+        conf_sessions.etag = etag
+        return conf_sessions
+
+    @instrumented
     @endpoints.method(CONF_SESSION_TYPE_GET_REQUEST, SessionForms,
                       path='getConferenceSessionsByType',
                       http_method='GET',
@@ -861,76 +2049,147 @@ class ConferenceApi(remote.Service):
         conf_sessions = Session.query(ancestor=ndb.Key(urlsafe=wsck))
         conf_sessions = conf_sessions.filter(
             Session.session_type == request.session_type)
-        return SessionForms(
-            items=[self._copySessionToForm(each_session)
-                   for each_session in conf_sessions])
-
-    @staticmethod
-    def _filterSessionsBySpeaker(in_sessions, websafe_speaker_key):
-        speaker = ndb.Key(urlsafe=websafe_speaker_key).get()
-        filtered_sessions = in_sessions.filter(
-            Session.speaker_key == speaker.key)
-        return (filtered_sessions, speaker.name)
-
-    @endpoints.method(SPEAKER_GET_REQUEST, SessionForms,
+        return self._copySessionsToForms(conf_sessions)
+
+    def _getSpeakerSessionsPage(self, speaker_keys, page_size, page_token):
+        """Return SessionForms of one page of the sessions of speakers,
+        found through the Session.speaker_key index."""
+        if not speaker_keys:
+            return SessionForms()
+        speaker_sessions = Session.query(
+            Session.speaker_key.IN(speaker_keys)).order(Session.key)
+        speaker_sessions, next_page_token = self._fetchPage(
+            speaker_sessions, page_size, page_token)
+        session_forms = self._copySessionsToForms(speaker_sessions)
+        session_forms.nextPageToken = next_page_token
+        return session_forms
+
+    @instrumented
+    @endpoints.method(SPEAKER_SESSIONS_GET_REQUEST, SessionForms,
                       path='getSessionsBySpeaker',
                       http_method='GET',
                       name='getSessionsBySpeaker')
     def getSessionsBySpeaker(self, request):
-        """Return sessions by a given speaker"""
+        """Return sessions by a given speaker, one page at a time"""
         try:
-            speaker = ndb.Key(urlsafe=request.websafeSpeakerKey).get()
+            speaker_key = ndb.Key(urlsafe=request.websafeSpeakerKey)
         except db.BadRequestError:
             raise endpoints.NotFoundException(
                 "No speaker found with key: %s "
                 % request.websafeSpeakerKey)
 
-        sessions_with_speaker = ndb.get_multi(speaker.sessionKeysSpeakAt)
+        # return set of SessionForm objects per Session
+        return self._getSpeakerSessionsPage(
+            [speaker_key], request.pageSize, request.pageToken)
+
+    @instrumented
+    @endpoints.method(SESSION_SPEAKER_GET_REQUEST, SessionForms,
+                      path='getSessionsBySpeakerName',
+                      http_method='GET',
+                      name='getSessionsBySpeakerName')
+    def getSessionsBySpeakerName(self, request):
+        """Return sessions by speakers with a given name (case insensitive),
+        one page at a time"""
+        if not request.speaker_name:
+            raise endpoints.BadRequestException(
+                "'speaker_name' field required")
+        # an IN filter runs one subquery per speaker, at most 30
+        speaker_keys = Speaker.query(
+            Speaker.nameLower == request.speaker_name.strip().lower()
+        ).fetch(30, keys_only=True)
 
         # return set of SessionForm objects per Session
-        return SessionForms(
-            items=[self._copySessionToForm(each_session)
-                   for each_session in sessions_with_speaker])
+        return self._getSpeakerSessionsPage(
+            speaker_keys, request.pageSize, request.pageToken)
 
-    def _alterWishlist(self, request, add=True):
-        """Add or remove sessions fromo wishlist."""
-        retval = None
+    @staticmethod
+    def _wishlistEntryKey(p_key, session_key):
+        """Return the key of a Session's WishlistEntry under a Profile."""
+        return ndb.Key(WishlistEntry, session_key.urlsafe(), parent=p_key)
+
+    def _wishlistSessionKeys(self, websafe_session_keys):
+        """Return distinct Session keys of websafe keys, in order."""
+        session_keys = []
+        for websafe_session_key in websafe_session_keys:
+            try:
+                session_key = ndb.Key(urlsafe=websafe_session_key)
+            except db.BadRequestError:
+                session_key = None
+            if not session_key or session_key.kind() != Session.__name__:
+                raise endpoints.NotFoundException(
+                    "No session found with key: %s " % websafe_session_key)
+            if session_key not in session_keys:
+                session_keys.append(session_key)
+        return session_keys
+
+    def _getWishlistProfile(self):
+        """Return user Profile, first moving a wishlist still kept on the
+        Profile to WishlistEntry children."""
         prof = self._getProfileFromUser()  # get user Profile
+        if prof.sessionKeysWishlist:
+            prof = self._migrateWishlist(prof.key)
+            self._invalidateProfile(prof.key.id())
+        return prof
 
-        # check if session exists given websafeSessionKey
+    @staticmethod
+    @ndb.transactional()
+    def _migrateWishlist(p_key):
+        """Move Profile.sessionKeysWishlist to WishlistEntry children."""
+        prof = p_key.get()
+        entries = [WishlistEntry(
+            key=ConferenceApi._wishlistEntryKey(p_key, session_key),
+            sessionKey=session_key)
+            for session_key in prof.sessionKeysWishlist]
+        prof.sessionKeysWishlist = []
+        ndb.put_multi(entries + [prof])
+        return prof
 
-        try:
-            session_key = ndb.Key(urlsafe=request.websafeSessionKey)
-        except db.BadRequestError:
-            raise endpoints.NotFoundException(
-                "No session found with key: %s " % request.websafeSessionKey)
+    @staticmethod
+    @ndb.transactional()
+    def _updateWishlist(p_key, add_keys, remove_keys):
+        """Add and remove Sessions in a Profile's wishlist, touching only
+        their WishlistEntry children; return (added, removed) counts."""
+        add_entry_keys = [ConferenceApi._wishlistEntryKey(p_key, session_key)
+                          for session_key in add_keys]
+        remove_entry_keys = [
+            ConferenceApi._wishlistEntryKey(p_key, session_key)
+            for session_key in remove_keys]
+        existing = set(entry.key for entry in ndb.get_multi(
+            add_entry_keys + remove_entry_keys) if entry)
+
+        new_entries = [WishlistEntry(key=entry_key, sessionKey=session_key)
+                       for entry_key, session_key in zip(add_entry_keys,
+                                                         add_keys)
+                       if entry_key not in existing]
+        removed_keys = [entry_key for entry_key in remove_entry_keys
+                        if entry_key in existing]
+        ndb.put_multi(new_entries)
+        ndb.delete_multi(removed_keys)
+        return len(new_entries), len(removed_keys)
+
+    def _alterWishlist(self, request, add=True):
+        """Add or remove sessions fromo wishlist."""
+        session_keys = self._wishlistSessionKeys(
+            [request.websafeSessionKey])
+        prof = self._getWishlistProfile()
 
         # add to wishlist
         if add:
+            added, _ = self._updateWishlist(prof.key, session_keys, [])
             # check if session already in user's wishlist
-            if session_key in prof.sessionKeysWishlist:
+            if not added:
                 raise ConflictException(
                     "Session already in your wishlist")
-
-            # add session to wishlist
-            prof.sessionKeysWishlist.append(session_key)
             retval = True
 
         # remove from wishlist
         else:
-            # check if session already in user's wishlist
-            if session_key in prof.sessionKeysWishlist:
-
-                # remove session from wishlist
-                prof.sessionKeysWishlist.remove(session_key)
-                retval = True
-            else:
-                retval = False
+            _, removed = self._updateWishlist(prof.key, [], session_keys)
+            retval = bool(removed)
 
-        # write things back to the datastore & return
-        prof.put()
         return BooleanMessage(data=retval)
 
+    @instrumented
     @endpoints.method(SESSION_GET_REQUEST, BooleanMessage,
                       path='session/wishlist/{websafeSessionKey}',
                       http_method='POST',
@@ -939,6 +2198,7 @@ class ConferenceApi(remote.Service):
         """Add session to wishlist"""
         return self._alterWishlist(request)
 
+    @instrumented
     @endpoints.method(SESSION_GET_REQUEST, BooleanMessage,
                       path='session/wishlist/{websafeSessionKey}',
                       http_method='DELETE',
@@ -947,67 +2207,66 @@ class ConferenceApi(remote.Service):
         """Remove session from wishlist"""
         return self._alterWishlist(request, add=False)
 
-    @endpoints.method(message_types.VoidMessage, SessionForms,
+    @instrumented
+    @endpoints.method(WishlistUpdateForm, WishlistUpdateResultForm,
+                      path='session/wishlist',
+                      http_method='POST',
+                      name='updateWishlist')
+    def updateWishlist(self, request):
+        """Add and remove many sessions in wishlist at once."""
+        if len(request.add) + len(request.remove) > WISHLIST_BATCH_SIZE:
+            raise endpoints.BadRequestException(
+                "At most %d sessions can be changed at once"
+                % WISHLIST_BATCH_SIZE)
+        add_keys = self._wishlistSessionKeys(request.add)
+        remove_keys = self._wishlistSessionKeys(request.remove)
+        if set(add_keys) & set(remove_keys):
+            raise endpoints.BadRequestException(
+                "A session cannot be both added and removed")
+
+        prof = self._getWishlistProfile()
+        added, removed = self._updateWishlist(prof.key, add_keys,
+                                              remove_keys)
+        return WishlistUpdateResultForm(added=added, removed=removed)
+
+    @instrumented
+    @endpoints.method(PAGE_GET_REQUEST, SessionForms,
                       path='session/wishlist',
                       http_method='GET',
                       name='getSessionsInWishlist')
     def getSessionsInWishlist(self, request):
-        """Get list of session that user has added to wishlist."""
-        prof = self._getProfileFromUser()  # get user Profile
-        conf_sessions = ndb.get_multi(prof.sessionKeysWishlist)
-
-        # return set of SessionForm objects per Session
-        return SessionForms(
-            items=[self._copySessionToForm(conf_session)
-                   for conf_session in conf_sessions])
-
-    def _getSessionQuery(self, request):
-        """Return formatted query from the submitted filters."""
-        wsck = request.websafeConferenceKey
-        conf_sessions = Session.query(ancestor=ndb.Key(urlsafe=wsck))
-        inequality_filter, filters = (self
-                                      ._formatSessionFilters(request.filters))
-
-        # If exists, sort on inequality filter first
-        if not inequality_filter:
-            conf_sessions = conf_sessions.order(Session.start_time)
-        else:
-            conf_sessions = conf_sessions.order(
-                ndb.GenericProperty(inequality_filter))
-            conf_sessions = conf_sessions.order(Session.start_time)
+        """Get list of session that user has added to wishlist,
+        one page at a time."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
 
-        for filtr in filters:
-            if filtr["field"] == "duration":
-                filtr["value"] = int(filtr["value"])
-            # processing start_time query
-            elif filtr["field"] == "start_time":
-                # when performing query on either DateProperty or TimeProperty
-                # in datastore, the datatype datetime is required (as opposing
-                # to the correspodning python datatype date and time). The
-                # following code segment convert the time string to proper
-                # datetime object for query operation. The date 1970-01-01 is
-                # used due to the fact datastore store that particular date to
-                # the value in TimeProperty
-                split_time = filtr["value"].split(":")
-                formatted_time = (
-                    "1970-01-01 " + split_time[0] + ":" + split_time[1])
-                filtr["value"] = (datetime
-                                  .strptime(formatted_time, "%Y-%m-%d %H:%M"))
-            formatted_query = ndb.query.FilterNode(
-                filtr["field"], filtr["operator"], filtr["value"])
-            print filtr["field"] + filtr["operator"] + str(filtr["value"])
-            try:
-                conf_sessions = conf_sessions.filter(formatted_query)
-                print conf_sessions.count()
-            except:
-                raise endpoints.BadRequestException(
-                    "Bad query operation.")
-        return conf_sessions
+        # the wishlist query runs while the Profile is read
+        query = WishlistEntry.query(
+            ancestor=ndb.Key(Profile, getUserId(user))).order(
+                WishlistEntry.added)
+        page = self._fetchPageAsync(query, request.pageSize,
+                                    request.pageToken)
+        prof = self._getProfileFromUser()  # get user Profile
+        if prof.sessionKeysWishlist:
+            # a wishlist still kept on the Profile is moved to
+            # WishlistEntry children first, then the query is run again
+            self._getWishlistProfile()
+            page = self._fetchPageAsync(query, request.pageSize,
+                                        request.pageToken)
+        entries, next_page_token = page.get_result()
+
+        # return set of SessionForm objects per Session; sessions and
+        # their speakers are each fetched in one batch
+        session_forms = self._copySessionsToForms(
+            ndb.get_multi([entry.sessionKey for entry in entries]))
+        session_forms.nextPageToken = next_page_token
+        return session_forms
 
     def _formatSessionFilters(self, filters):
-        """Parse, check validity and format user supplied filters."""
+        """Parse, check validity and format user supplied filters,
+        converting each value to the type of its field."""
         formatted_filters = []
-        inequality_field = None
 
         for f in filters:
             filtr = {field.name: getattr(f, field.name)
@@ -1020,34 +2279,184 @@ class ConferenceApi(remote.Service):
                 raise endpoints.BadRequestException(
                     "Filter contains invalid field or operator.")
 
-            # Every operation except "=" is an inequality
-            if filtr["operator"] != "=":
-                # check if inequality operation has been used in previous
-                # filters disallow the filter if inequality was performed
-                # on a different field before track the field on which the
-                # inequality operation is performed
-                if inequality_field and inequality_field != filtr["field"]:
-                    raise endpoints.BadRequestException(
-                        "Inequality filter is allowed on only one field.")
-                else:
-                    inequality_field = filtr["field"]
+            try:
+                if filtr["field"] == "duration":
+                    filtr["value"] = int(filtr["value"])
+                elif filtr["field"] == "start_time":
+                    split_time = filtr["value"].split(":")
+                    formatted_time = split_time[0] + ":" + split_time[1]
+                    filtr["value"] = (datetime
+                                      .strptime(formatted_time, "%H:%M")
+                                      .time())
+            except (AttributeError, IndexError, TypeError, ValueError):
+                raise endpoints.BadRequestException(
+                    "Filter contains invalid value for %s." % filtr["field"])
 
             formatted_filters.append(filtr)
-        return (inequality_field, formatted_filters)
+        return formatted_filters
 
+    def _planSessionQuery(self, filters, ancestor=None):
+        """Split formatted session filters into one datastore query and
+        predicates applied in memory.
+
+        The datastore runs the most selective filters on a single field
+        that an existing index serves: an equality, else a range with both
+        bounds, else a one-sided range; start_time wins ties. NE filters and
+        everything else are checked in memory. Return a dict with the
+        query, the residual filters and a description of the plan.
+        """
+        candidates = []
+        for field in SESSION_FIELDS.values():
+            field_filters = [filtr for filtr in filters
+                             if filtr["field"] == field and
+                             filtr["operator"] != "!="]
+            equalities = [filtr for filtr in field_filters
+                          if filtr["operator"] == "="]
+            lower = [filtr for filtr in field_filters
+                     if filtr["operator"] in (">", ">=")]
+            upper = [filtr for filtr in field_filters
+                     if filtr["operator"] in ("<", "<=")]
+            tie_break = 0 if field == "start_time" else 1
+            if equalities:
+                candidates.append((0, tie_break, field, equalities[:1]))
+            elif lower and upper:
+                candidates.append((1, tie_break, field, lower[:1] + upper[:1]))
+            elif lower or upper:
+                candidates.append((2, tie_break, field, (lower or upper)[:1]))
+
+        query = Session.query(ancestor=ancestor)
+        pushed = []
+        inequality_field = None
+        if candidates:
+            score, tie_break, field, pushed = min(candidates)
+            if score:
+                inequality_field = field
+            else:
+                # an equality combines with a start_time range through the
+                # (field, start_time) indexes
+                time_ranges = [candidate for candidate in candidates
+                               if candidate[0] and
+                               candidate[2] == "start_time"]
+                if time_ranges and field != "start_time":
+                    pushed = pushed + min(time_ranges)[3]
+                    inequality_field = "start_time"
+        for filtr in pushed:
+            value = filtr["value"]
+            if filtr["field"] == "start_time":
+                # when performing query on either DateProperty or TimeProperty
+                # in datastore, the datatype datetime is required (as opposing
+                # to the correspodning python datatype date and time). The
+                # date 1970-01-01 is used due to the fact datastore store that
+                # particular date to the value in TimeProperty
+                value = datetime(1970, 1, 1, value.hour, value.minute)
+            query = query.filter(ndb.query.FilterNode(
+                filtr["field"], filtr["operator"], value))
+
+        # If exists, sort on inequality filter first; the orders match the
+        # existing Session composite indexes
+        if inequality_field and inequality_field != "start_time":
+            query = query.order(ndb.GenericProperty(inequality_field))
+        query = query.order(Session.start_time)
+
+        residual = [filtr for filtr in filters
+                    if all(filtr is not each for each in pushed)]
+        description = 'datastore: %s; memory: %s' % (
+            self._describeSessionFilters(pushed) or 'all sessions',
+            self._describeSessionFilters(residual) or 'none')
+        return {'query': query, 'residual': residual,
+                'description': description}
+
+    @staticmethod
+    def _describeSessionFilters(filters):
+        """Return formatted session filters as readable text."""
+        return ' AND '.join(
+            '%s %s %s' % (filtr["field"], filtr["operator"], filtr["value"])
+            for filtr in filters)
+
+    @staticmethod
+    def _matchesSessionFilter(session_object, filtr):
+        """Check a Session against one formatted filter in memory."""
+        value = getattr(session_object, filtr["field"])
+        # the datastore sorts null below every other value, so that e.g.
+        # "< x" and "!= x" match a missing value; compare the same way
+        return PY_OPERATORS[filtr["operator"]](
+            (value is not None, value),
+            (filtr["value"] is not None, filtr["value"]))
+
+    def _runSessionPlan(self, plan, page_size=None, page_token=None,
+                        paged=True):
+        """Stream the plan's datastore query through its in-memory filters,
+        a page's worth of sessions at a time, stopping as soon as a page is
+        full.
+
+        Return (sessions, nextPageToken); with paged=False every matching
+        session is returned.
+        """
+        page_size = self._pageSize(page_size) if paged else None
+        # like fetch_page(), each batch reads one session past its end to
+        # tell whether there are more; a query iterator without a limit
+        # goes on fetching batches whenever the request waits on an RPC
+        options = ({'limit': page_size + 1, 'batch_size': page_size + 1}
+                   if paged else {})
+        sessions = []
+        next_page_token = None
+        scanned = 0
+        try:
+            cursor = Cursor(urlsafe=page_token) if page_token else None
+            while True:
+                results = plan['query'].iter(start_cursor=cursor,
+                                             produce_cursors=paged,
+                                             **options)
+                for each_session in itertools.islice(results, page_size):
+                    scanned += 1
+                    if all(self._matchesSessionFilter(each_session, filtr)
+                           for filtr in plan['residual']):
+                        sessions.append(each_session)
+                        if page_size and len(sessions) >= page_size:
+                            break
+                if not paged or not results.has_next():
+                    break
+                cursor = results.cursor_after()
+                if len(sessions) >= page_size:
+                    next_page_token = cursor.urlsafe()
+                    break
+        except (db.BadValueError, db.BadRequestError):
+            raise endpoints.BadRequestException(
+                "Bad query operation or page token.")
+        logDebug('sessionQuery.run', plan=plan['description'],
+                 scanned=scanned, matched=len(sessions),
+                 more=next_page_token is not None)
+        return sessions, next_page_token
+
+    @instrumented
     @endpoints.method(CONF_SESSION_QUERY_GET_REQUEST, SessionForms,
                       path='querySession',
                       http_method='POST',
                       name='querySession')
     def querySession(self, request):
-        """Query for sessions"""
-        conf_sessions = self._getSessionQuery(request)
-
-        # return individual ConferenceForm object per Conference
-        return SessionForms(
-            items=[self._copySessionToForm(one_session)
-                   for one_session in conf_sessions])
-
+        """Query for sessions, one page at a time; any number of
+        inequality filters may be combined."""
+        try:
+            conf_key = ndb.Key(urlsafe=request.websafeConferenceKey)
+        except db.BadRequestError:
+            raise endpoints.NotFoundException(
+                "No conference found with key: %s"
+                % request.websafeConferenceKey)
+        plan = self._planSessionQuery(
+            self._formatSessionFilters(request.filters), ancestor=conf_key)
+        logDebug('querySession.plan', conference=conf_key.urlsafe(),
+                 plan=plan['description'])
+        conf_sessions, next_page_token = self._runSessionPlan(
+            plan, request.pageSize, request.pageToken)
+
+        # return individual SessionForm object per Session
+        session_forms = self._copySessionsToForms(conf_sessions)
+        session_forms.nextPageToken = next_page_token
+        if request.debug:
+            session_forms.queryPlan = plan['description']
+        return session_forms
+
+    @instrumented
     @endpoints.method(message_types.VoidMessage, SessionForms,
                       path='solvedProblematicQuery',
                       http_method='GET',
@@ -1055,14 +2464,11 @@ class ConferenceApi(remote.Service):
     def solvedProblematicQuery(self, request):
         """ Implementation of proposed solution for problematic query in Task 3.
         """
-        all_sessions = Session.query()
-        all_sessions = (all_sessions
-                        .filter(Session.start_time < time(19, 00))
-                        .order(Session.start_time))
-        sfs = SessionForms()
-        for item in all_sessions:
-            if item.session_type != "workshops":
-                sfs.items.append(self._copySessionToForm(item))
-        return sfs
+        plan = self._planSessionQuery([
+            {"field": "start_time", "operator": "<", "value": time(19, 00)},
+            {"field": "session_type", "operator": "!=",
+             "value": "workshops"}])
+        all_sessions, _ = self._runSessionPlan(plan, paged=False)
+        return self._copySessionsToForms(all_sessions)
 
 api = endpoints.api_server([ConferenceApi])  # register API
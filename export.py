@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+"""export.py
+
+Udacity conference server-side Python App Engine bulk export of
+Conference, Session, Speaker & Profile entities as newline-delimited JSON
+or CSV; a chain of tasks walks each kind with a cursor, storing one
+ExportChunk per batch and checkpointing the cursor with it, so memory use
+does not grow with the dataset and an interrupted task resumes where the
+last chunk left off.
+
+"""
+
+import csv
+import json
+import StringIO
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+from google.appengine.datastore.datastore_query import Cursor
+
+from models import Conference
+from models import ExportChunk
+from models import ExportJob
+from models import Profile
+from models import Session
+from models import Speaker
+
+EXPORT_KINDS = {
+    'Conference': Conference,
+    'Session': Session,
+    'Speaker': Speaker,
+    'Profile': Profile,
+}
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+EXPORT_BATCH_SIZE = 500         # entities per ExportChunk
+EXPORT_BATCHES_PER_TASK = 20    # chunks written before chaining a new task
+
+
+def _toJson(value):
+    if isinstance(value, ndb.Key):
+        return value.urlsafe()
+    return str(value)
+
+
+def _toRow(entity):
+    """Return an entity's properties, key & parent key as a dict."""
+    row = entity.to_dict()
+    row['key'] = entity.key.urlsafe()
+    if entity.key.parent():
+        row['parent'] = entity.key.parent().urlsafe()
+    return row
+
+
+def _csvValue(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return json.dumps(value, default=_toJson)
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return _toJson(value)
+
+
+def _encode(job, entities):
+    """Encode a batch of entities in the job's format; CSV output starts
+    with a header row in the first chunk."""
+    if job.format == 'ndjson':
+        return ''.join(json.dumps(_toRow(entity), default=_toJson,
+                                  sort_keys=True) + '\n'
+                       for entity in entities)
+
+    columns = ['key', 'parent'] + sorted(EXPORT_KINDS[job.kind]._properties)
+    output = StringIO.StringIO()
+    writer = csv.writer(output)
+    if not job.chunks:
+        writer.writerow(columns)
+    for entity in entities:
+        row = _toRow(entity)
+        writer.writerow([_csvValue(row.get(column)) for column in columns])
+    return output.getvalue().decode('utf-8')
+
+
+def _scheduleExport(job_id, transactional=False):
+    taskqueue.add(params={'job_id': job_id}, url='/tasks/export',
+                  transactional=transactional)
+
+
+def startExport(kinds, export_format):
+    """Create an ExportJob per kind & queue their first tasks; return
+    the jobs.
+
+    Raise ValueError for an unknown kind or format.
+    """
+    for kind in kinds:
+        if kind not in EXPORT_KINDS:
+            raise ValueError('Unknown kind: %s' % kind)
+    if export_format not in EXPORT_CONTENT_TYPES:
+        raise ValueError('Unknown format: %s' % export_format)
+    jobs = [ExportJob(kind=kind, format=export_format) for kind in kinds]
+    ndb.put_multi(jobs)
+    for job in jobs:
+        _scheduleExport(job.key.id())
+    return jobs
+
+
+@ndb.transactional()
+def _storeChunk(job_key, seq, data, rows, cursor, chain):
+    """Store chunk seq and checkpoint the cursor after it; return the
+    updated job, or None if another task has already stored it."""
+    job = job_key.get()
+    if job.status != 'running' or job.chunks != seq:
+        return None
+    chunk = ExportChunk(parent=job_key, id=seq + 1, data=data)
+    job.chunks += 1
+    job.rows += rows
+    job.cursor = cursor
+    if cursor is None:
+        job.status = 'done'
+    elif chain:
+        # queued only if this checkpoint commits, so the chain never forks
+        _scheduleExport(job_key.id(), transactional=True)
+    ndb.put_multi([job, chunk])
+    return job
+
+
+def runExport(job_id):
+    """Export the next EXPORT_BATCHES_PER_TASK batches of an ExportJob."""
+    job = ExportJob.get_by_id(job_id)
+    if not job or job.status != 'running':
+        return
+    query = EXPORT_KINDS[job.kind].query()
+    cursor = Cursor(urlsafe=job.cursor) if job.cursor else None
+    context = ndb.get_context()
+
+    for batch in range(EXPORT_BATCHES_PER_TASK):
+        # bypass the caches so only the current batch is held in memory
+        entities, next_cursor, more = query.fetch_page(
+            EXPORT_BATCH_SIZE, start_cursor=cursor,
+            use_cache=False, use_memcache=False)
+        job = _storeChunk(
+            job.key, job.chunks, _encode(job, entities), len(entities),
+            next_cursor.urlsafe() if more and next_cursor else None,
+            chain=batch == EXPORT_BATCHES_PER_TASK - 1)
+        context.clear_cache()
+        if not job or job.status != 'running':
+            return
+        cursor = next_cursor
+
+
+def getChunk(job_id, seq):
+    """Return (ExportJob, its ExportChunk number seq, counting from 1);
+    either may be None."""
+    job_key = ndb.Key(ExportJob, job_id)
+    job, chunk = ndb.get_multi([job_key,
+                                ndb.Key(ExportChunk, seq, parent=job_key)])
+    return job, chunk
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+
+"""instrumentation.py
+
+Udacity conference server-side Python App Engine per-request metrics: wall
+time, RPC count & duration by service, datastore entities read & written
+and response size of every endpoint and task handler, logged as one JSON
+line per request and aggregated per instance. Requests issuing more RPCs
+than their RPC_BUDGETS allow are logged as over budget.
+
+"""
+
+import collections
+import contextlib
+import functools
+import json
+import logging
+import random
+import threading
+import time
+
+from google.appengine.api import apiproxy_stub_map
+from protorpc import protojson
+
+HOOK_NAME = 'conference_instrumentation'
+
+# encoding a response just to measure it costs as much as the encoding
+# endpoints does itself, so only this fraction of responses is measured
+RESPONSE_SIZE_SAMPLE_RATE = 0.01
+
+# datastore_v3 calls whose entities are counted, and how to count them
+_ENTITIES_READ = {
+    'Get': lambda request, response: response.entity_size(),
+    'RunQuery': lambda request, response: response.result_size(),
+    'Next': lambda request, response: response.result_size(),
+}
+_ENTITIES_WRITTEN = {
+    'Put': lambda request, response: request.entity_size(),
+    'Delete': lambda request, response: request.key_size(),
+}
+
+# metrics being collected by this thread, innermost last; every RPC is
+# accounted to all of them, so a budgeted block sees the RPCs of the
+# instrumented endpoints it calls
+_local = threading.local()
+
+# RPCs one call of an endpoint or task handler may issue at most, by
+# service: twice the most benchmark.py saw with cold caches at several
+# dataset sizes, plus two, leaving room for extra query batches and
+# transaction retries but not for an RPC per result. registerForConference
+# is budgeted from its concurrent registration load instead, where
+# contended shards are retried. filterPlayground, solvedProblematicQuery
+# and the export & mapper tasks page through whole kinds and have no budget
+RPC_BUDGETS = {
+    'addSessionToWishlist': {'datastore_v3': 12, 'memcache': 8},
+    'createConference': {'datastore_v3': 6, 'memcache': 8},
+    'createSession': {'datastore_v3': 20, 'memcache': 24},
+    'createSpeaker': {'datastore_v3': 6, 'memcache': 6},
+    'deleteSessionInWishlist': {'datastore_v3': 16, 'memcache': 8},
+    'getAllSpeakers': {'datastore_v3': 14},
+    'getAnnouncement': {'datastore_v3': 4, 'memcache': 12},
+    'getConference': {'datastore_v3': 6, 'memcache': 18},
+    'getConferenceAttendees': {'datastore_v3': 14, 'memcache': 12},
+    'getConferenceFeaturedSpeakers': {'memcache': 4},
+    'getConferenceSessions': {'datastore_v3': 30, 'memcache': 24},
+    'getConferenceSessionsByType': {'datastore_v3': 10},
+    'getConferencesCreated': {'datastore_v3': 4, 'memcache': 4},
+    'getConferencesToAttend': {'datastore_v3': 8, 'memcache': 14},
+    'getFeaturedSpeaker': {'memcache': 4},
+    'getFeaturedSpeakersForConferences': {'memcache': 4},
+    'getProfile': {'datastore_v3': 8, 'memcache': 10},
+    'getSessionsBySpeaker': {'datastore_v3': 8},
+    'getSessionsBySpeakerName': {'datastore_v3': 8},
+    'getSessionsInWishlist': {'datastore_v3': 14, 'memcache': 12},
+    'getSpeaker': {'datastore_v3': 6, 'memcache': 10},
+    'getSpeakerSummaries': {'datastore_v3': 16},
+    'importAgenda': {'datastore_v3': 24, 'memcache': 28},
+    'isRegisteredForConference': {'datastore_v3': 4, 'memcache': 12},
+    'queryConferenceSummaries': {'datastore_v3': 16},
+    'queryConferences': {'datastore_v3': 8, 'memcache': 18},
+    'querySession': {'datastore_v3': 6},
+    'registerForConference': {'datastore_v3': 188, 'memcache': 78},
+    'saveProfile': {'datastore_v3': 10, 'memcache': 16},
+    'searchSpeakers': {'datastore_v3': 10},
+    'unregisterFromConference': {'datastore_v3': 26, 'memcache': 18},
+    'updateConference': {'datastore_v3': 12, 'memcache': 8},
+    'updateSpeaker': {'datastore_v3': 10, 'memcache': 6},
+    'updateWishlist': {'datastore_v3': 12, 'memcache': 8},
+    'ExportHandler': {'datastore_v3': 4, 'memcache': 10},
+    'FindFeaturedSpeakerHandler': {'datastore_v3': 6, 'memcache': 16},
+    'MapperHandler': {'datastore_v3': 4, 'memcache': 10},
+    'RebuildAgendaHandler': {'datastore_v3': 18, 'memcache': 16},
+    'ReconcileSeatsHandler': {'datastore_v3': 12, 'memcache': 14},
+    'SetAnnouncementHandler': {'datastore_v3': 12, 'memcache': 8},
+    'SpeakerRenamedHandler': {'datastore_v3': 6, 'memcache': 10},
+}
+
+# aggregated metrics by endpoint or handler name; they are kept per
+# instance and start from zero whenever an instance starts
+ENDPOINT_STATS = {}
+_endpoint_stats_lock = threading.Lock()
+
+
+class RequestStats(object):
+    """RequestStats -- metrics of one request or budgeted block"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rpcs = collections.defaultdict(lambda: [0, 0.0])  # calls, ms
+        self.entities_read = 0
+        self.entities_written = 0
+
+    def addRpc(self, service, ms, entities_read, entities_written):
+        """Account one completed RPC."""
+        rpc_stats = self.rpcs[service]
+        rpc_stats[0] += 1
+        rpc_stats[1] += ms
+        self.entities_read += entities_read
+        self.entities_written += entities_written
+
+    def rpcCount(self, service=None):
+        """Return the number of RPCs issued, to service or to all."""
+        if service:
+            return self.rpcs[service][0] if service in self.rpcs else 0
+        return sum(calls for calls, _ in self.rpcs.values())
+
+
+def _push(stats):
+    """Start accounting this thread's RPCs to stats as well."""
+    if not getattr(_local, 'stack', None):
+        _local.stack = []
+        _local.started = {}
+    _local.stack.append(stats)
+
+
+def _pop():
+    _local.stack.pop()
+
+
+def _preCallHook(service, call, request, response, rpc):
+    if getattr(_local, 'stack', None):
+        _local.started[id(rpc or request)] = time.time()
+
+
+def _postCallHook(service, call, request, response, rpc, error):
+    if not getattr(_local, 'stack', None):
+        return
+    started = _local.started.pop(id(rpc or request), None)
+    ms = (time.time() - started) * 1000 if started is not None else 0.0
+    entities_read = entities_written = 0
+    if service == 'datastore_v3' and not error:
+        try:
+            if call in _ENTITIES_READ:
+                entities_read = _ENTITIES_READ[call](request, response)
+            elif call in _ENTITIES_WRITTEN:
+                entities_written = _ENTITIES_WRITTEN[call](request, response)
+        except AttributeError:
+            pass
+    for stats in _local.stack:
+        stats.addRpc(service, ms, entities_read, entities_written)
+
+
+def installHooks():
+    """Hook RPC accounting into the current API proxy; testbed replaces
+    the proxy, so call this again after activating one."""
+    apiproxy_stub_map.apiproxy.GetPreCallHooks().Append(
+        HOOK_NAME, _preCallHook)
+    apiproxy_stub_map.apiproxy.GetPostCallHooks().Append(
+        HOOK_NAME, _postCallHook)
+
+
+def _overBudget(stats, budgets):
+    """Return a description of each service stats went over budget on."""
+    return ['%s: %d RPCs, budget %d' % (service, stats.rpcCount(service),
+                                        budget)
+            for service, budget in sorted(budgets.items())
+            if stats.rpcCount(service) > budget]
+
+
+def _record(stats, elapsed_ms, response_bytes, error):
+    """Log one request's metrics and add them to ENDPOINT_STATS;
+    response_bytes is None if the response was not measured."""
+    over_budget = _overBudget(stats, RPC_BUDGETS.get(stats.name, {}))
+    if over_budget:
+        logging.warning(json.dumps({
+            'event': 'rpc_budget_exceeded',
+            'name': stats.name,
+            'overBudget': over_budget,
+        }, sort_keys=True))
+
+    logging.info(json.dumps({
+        'event': 'request_stats',
+        'name': stats.name,
+        'ms': round(elapsed_ms, 1),
+        'rpcs': dict((service, {'calls': calls, 'ms': round(ms, 1)})
+                     for service, (calls, ms) in stats.rpcs.items()),
+        'entitiesRead': stats.entities_read,
+        'entitiesWritten': stats.entities_written,
+        'responseBytes': response_bytes,
+        'error': error,
+    }, sort_keys=True))
+
+    with _endpoint_stats_lock:
+        aggregate = ENDPOINT_STATS.setdefault(stats.name, {
+            'calls': 0, 'errors': 0, 'totalMs': 0.0, 'maxMs': 0.0,
+            'rpcs': {}, 'entitiesRead': 0, 'entitiesWritten': 0,
+            'responseBytes': 0, 'responseSamples': 0, 'overBudget': 0})
+        aggregate['calls'] += 1
+        aggregate['errors'] += 1 if error else 0
+        aggregate['overBudget'] += 1 if over_budget else 0
+        aggregate['totalMs'] += elapsed_ms
+        aggregate['maxMs'] = max(aggregate['maxMs'], elapsed_ms)
+        aggregate['entitiesRead'] += stats.entities_read
+        aggregate['entitiesWritten'] += stats.entities_written
+        if response_bytes is not None:
+            aggregate['responseBytes'] += response_bytes
+            aggregate['responseSamples'] += 1
+        for service, (calls, ms) in stats.rpcs.items():
+            rpc_aggregate = aggregate['rpcs'].setdefault(
+                service, {'calls': 0, 'totalMs': 0.0})
+            rpc_aggregate['calls'] += calls
+            rpc_aggregate['totalMs'] += ms
+
+
+def _measure(name, call, response_size):
+    """Run call() with its RPCs accounted to name; return its result."""
+    installHooks()
+    stats = RequestStats(name)
+    _push(stats)
+    start = time.time()
+    error = None
+    response_bytes = None
+    try:
+        result = call()
+        response_bytes = response_size(result)
+        return result
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _pop()
+        _record(stats, (time.time() - start) * 1000, response_bytes, error)
+
+
+def _messageSize(message):
+    """Return the encoded size of a sample of responses, else None."""
+    if random.random() >= RESPONSE_SIZE_SAMPLE_RATE:
+        return None
+    return len(protojson.encode_message(message)) if message else 0
+
+
+def instrumented(method):
+    """Decorate an @endpoints.method so each call is measured under the
+    endpoint's name."""
+    method_info = getattr(method, 'method_info', None)
+    name = getattr(method_info, 'name', None) or method.__name__
+
+    @functools.wraps(method)
+    def wrapper(service, request):
+        return _measure(name, lambda: method(service, request), _messageSize)
+    return wrapper
+
+
+def instrumentHandler(handler_class):
+    """Decorate a webapp2.RequestHandler class so each get() and post() is
+    measured under the handler's class name."""
+    for http_method in ('get', 'post'):
+        method = handler_class.__dict__.get(http_method)
+        if method:
+            setattr(handler_class, http_method, _instrumentHandlerMethod(
+                handler_class.__name__, method))
+    return handler_class
+
+
+def _instrumentHandlerMethod(name, method):
+    @functools.wraps(method)
+    def wrapper(handler, *args, **kwargs):
+        return _measure(name, lambda: method(handler, *args, **kwargs),
+                        lambda result: len(handler.response.body or ''))
+    return wrapper
+
+
+@contextlib.contextmanager
+def rpcBudget(**budgets):
+    """Fail with AssertionError if the block issues more RPCs to a service
+    than its budget, e.g. rpcBudget(datastore_v3=2, memcache=1); meant
+    for testbed tests guarding against N+1 access patterns."""
+    installHooks()
+    stats = RequestStats('rpcBudget')
+    _push(stats)
+    try:
+        yield stats
+    finally:
+        _pop()
+    over = _overBudget(stats, budgets)
+    if over:
+        raise AssertionError('RPC budget exceeded; ' + '; '.join(over))
+
+
+installHooks()
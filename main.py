@@ -12,12 +12,20 @@ created by wesc on 2014 may 24
 
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
+import json
+
 import webapp2
 from google.appengine.api import app_identity
 from google.appengine.api import mail
 from conference import ConferenceApi
+import export
+import mapper
+from models import ExportJob
+from models import MapperJob
+from instrumentation import instrumentHandler
 
 
+@instrumentHandler
 class SetAnnouncementHandler(webapp2.RequestHandler):
     def get(self):
         """Set Announcement in Memcache."""
@@ -25,6 +33,7 @@ class SetAnnouncementHandler(webapp2.RequestHandler):
         self.response.set_status(204)
 
 
+@instrumentHandler
 class SendConfirmationEmailHandler(webapp2.RequestHandler):
     def post(self):
         """Send email confirming Conference creation."""
@@ -39,24 +48,143 @@ class SendConfirmationEmailHandler(webapp2.RequestHandler):
         )
 
 
+@instrumentHandler
 class FindFeaturedSpeakerHandler(webapp2.RequestHandler):
     def post(self):
         """Find speakers with more than one session at a conference"""
-        websafe_speaker_key = self.request.get('websafe_speaker_key')
         wsck = self.request.get('wsck')
-        conf_sessions = ConferenceApi._getConferenceSessions(wsck)
-        if conf_sessions:
-            filtered_sessions, speaker_name = (
-                (ConferenceApi._filterSessionsBySpeaker(
-                    conf_sessions, websafe_speaker_key)))
-            number_of_sessions = filtered_sessions.count()
+        for websafe_speaker_key, speaker_name, session_name in zip(
+                self.request.get_all('websafe_speaker_key'),
+                self.request.get_all('speaker_name'),
+                self.request.get_all('session_name')):
+            number_of_sessions = ConferenceApi._getSpeakerSessionCount(
+                wsck, websafe_speaker_key)
             if number_of_sessions >= 2:
-                session_name = self.request.get('session_name')
-                ConferenceApi._cacheFeaturedSpeaker(session_name, speaker_name)
+                ConferenceApi._cacheFeaturedSpeaker(
+                    wsck, websafe_speaker_key, speaker_name, session_name)
+
+
+@instrumentHandler
+class RebuildAgendaHandler(webapp2.RequestHandler):
+    def post(self):
+        """Rebuild the agenda snapshots of the given conferences."""
+        for wsck in self.request.get_all('wsck'):
+            ConferenceApi._buildAgendaSnapshot(wsck, retry=True)
+
+
+@instrumentHandler
+class SpeakerRenamedHandler(webapp2.RequestHandler):
+    def post(self):
+        """Refresh data derived from a speaker's name."""
+        ConferenceApi._speakerRenamed(
+            self.request.get('websafe_speaker_key'),
+            self.request.get('cursor') or None)
+
+
+@instrumentHandler
+class ReconcileSeatsHandler(webapp2.RequestHandler):
+    def post(self):
+        """Copy sharded seat counts back to Conference.seatsAvailable."""
+        ConferenceApi._reconcileSeatsAvailable(self.request.get('wsck'))
+
+
+@instrumentHandler
+class ExportHandler(webapp2.RequestHandler):
+    def post(self):
+        """Start exporting the given kinds (all by default) as ndjson or
+        csv; reply with the export job ids."""
+        try:
+            jobs = export.startExport(
+                self.request.get_all('kind') or sorted(export.EXPORT_KINDS),
+                self.request.get('format', 'ndjson'))
+        except ValueError as e:
+            self.abort(400, detail=str(e))
+        self.response.content_type = 'application/json'
+        self.response.write(json.dumps(
+            {'jobs': [{'job': job.key.id(), 'kind': job.kind}
+                      for job in jobs]}))
+
+    def get(self):
+        """Return chunk number `chunk` (from 1) of export `job`, or the
+        job's progress when no chunk is given."""
+        try:
+            job_id = int(self.request.get('job'))
+            seq = int(self.request.get('chunk') or 0)
+        except ValueError:
+            self.abort(400, detail='job and chunk must be integers')
+
+        if seq:
+            job, chunk = export.getChunk(job_id, seq)
+        else:
+            job, chunk = ExportJob.get_by_id(job_id), None
+        if not job or (seq and not chunk):
+            self.abort(404)
+
+        self.response.headers['X-Export-Status'] = str(job.status)
+        self.response.headers['X-Export-Chunks'] = str(job.chunks)
+        if chunk:
+            self.response.content_type = (
+                export.EXPORT_CONTENT_TYPES[job.format])
+            self.response.write(chunk.data)
+        else:
+            self.response.content_type = 'application/json'
+            self.response.write(json.dumps({
+                'job': job_id, 'kind': job.kind, 'format': job.format,
+                'status': job.status, 'chunks': job.chunks,
+                'rows': job.rows}))
+
+
+@instrumentHandler
+class ExportTaskHandler(webapp2.RequestHandler):
+    def post(self):
+        """Export the next batches of an export job."""
+        export.runExport(int(self.request.get('job_id')))
+
+
+@instrumentHandler
+class MapperHandler(webapp2.RequestHandler):
+    def post(self):
+        """Start the named mapper, dry-run unless dry_run=0; reply with
+        the mapper job id."""
+        try:
+            job = mapper.startMapper(self.request.get('name'),
+                                     self.request.get('dry_run') != '0')
+        except ValueError as e:
+            self.abort(400, detail=str(e))
+        self.response.content_type = 'application/json'
+        self.response.write(json.dumps({'job': job.key.id()}))
+
+    def get(self):
+        """Return the progress of mapper job `job`."""
+        try:
+            job = MapperJob.get_by_id(int(self.request.get('job')))
+        except ValueError:
+            self.abort(400, detail='job must be an integer')
+        if not job:
+            self.abort(404)
+        self.response.content_type = 'application/json'
+        self.response.write(json.dumps({
+            'job': job.key.id(), 'name': job.name, 'dryRun': job.dryRun,
+            'status': job.status, 'batches': job.batches,
+            'processed': job.processed, 'written': job.written}))
+
+
+@instrumentHandler
+class MapperTaskHandler(webapp2.RequestHandler):
+    def post(self):
+        """Map the next batch of a mapper job."""
+        mapper.runMapper(int(self.request.get('job_id')))
 
 
 app = webapp2.WSGIApplication([
     ('/crons/set_announcement', SetAnnouncementHandler),
     ('/tasks/send_confirmation_email', SendConfirmationEmailHandler),
     ('/tasks/find_featured_speaker', FindFeaturedSpeakerHandler),
+    ('/tasks/reconcile_seats', ReconcileSeatsHandler),
+    ('/tasks/rebuild_agenda', RebuildAgendaHandler),
+    ('/tasks/speaker_renamed', SpeakerRenamedHandler),
+    ('/tasks/export', ExportTaskHandler),
+    ('/tasks/mapper', MapperTaskHandler),
+    ('/export', ExportHandler),
+    ('/mapper', MapperHandler),
 ], debug=True)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+"""mapper.py
+
+Udacity conference server-side Python App Engine backfills; a mapper
+applies a transform to every entity of a kind, one cursor-paged batch per
+task, writing what the transform returns with put_multi. Transactional
+mappers instead re-read each entity and write what the transform returns
+in a transaction of its own, so they don't overwrite concurrent updates.
+Progress is checkpointed after each batch and the next task is delayed to
+keep to the mapper's write rate. A batch is re-run when its task is
+retried before the checkpoint commits, so transforms must be idempotent.
+
+"""
+
+import collections
+import time
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+from google.appengine.datastore.datastore_query import Cursor
+
+from conference import ConferenceApi
+from models import Conference
+from models import MapperJob
+from models import Profile
+from models import Session
+from models import Speaker
+from models import SpeakerSessionCount
+from models import WishlistEntry
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_WRITES_PER_SECOND = 50
+
+# entity groups one xg transaction may touch
+XG_TRANSACTION_GROUPS = 25
+
+# mapper name -> Mapper
+MAPPERS = {}
+
+
+class Mapper(object):
+    """Mapper -- transform(entity) applied to every entity of model_class;
+    the transform returns the entities to put, if any.
+
+    A transactional mapper calls the transform in an xg transaction per
+    entity, on the entity as read in it, and calls it again until it has
+    nothing left to write. If select(entities) is given, it is called with
+    each batch first and returns the entities that need a transaction, so
+    reads common to the batch are made once.
+    """
+
+    def __init__(self, name, model_class, transform,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 writes_per_second=DEFAULT_WRITES_PER_SECOND,
+                 transactional=False, select=None):
+        self.name = name
+        self.model_class = model_class
+        self.transform = transform
+        self.batch_size = batch_size
+        self.writes_per_second = writes_per_second
+        self.transactional = transactional
+        self.select = select
+
+    def mapBatch(self, cursor, dry_run=False):
+        """Transform the batch after cursor; return (entities processed,
+        entities written, cursor of the next batch or None)."""
+        # bypass the caches so only the current batch is held in memory
+        entities, next_cursor, more = self.model_class.query().fetch_page(
+            self.batch_size, start_cursor=cursor,
+            keys_only=self.transactional and not self.select,
+            use_cache=False, use_memcache=False)
+        if self.transactional:
+            keys = ([entity.key for entity in self.select(entities)]
+                    if self.select else entities)
+            written = sum(self._mapEntity(key, dry_run) for key in keys)
+        else:
+            to_put = []
+            for entity in entities:
+                to_put.extend(self.transform(entity) or [])
+            if to_put and not dry_run:
+                ndb.put_multi(to_put, use_cache=False)
+            written = len(to_put)
+        ndb.get_context().clear_cache()
+        return len(entities), written, next_cursor if more else None
+
+    def _mapEntity(self, key, dry_run):
+        """Transform one entity in transactions of its own; return the
+        number of entities written."""
+        written = 0
+        while True:
+            entity_written = ndb.transaction(
+                lambda: self._transformInTransaction(key, dry_run), xg=True)
+            written += entity_written
+            if dry_run or not entity_written:
+                return written
+
+    def _transformInTransaction(self, key, dry_run):
+        entity = key.get(use_cache=False)
+        to_put = (self.transform(entity) or []) if entity else []
+        if to_put and not dry_run:
+            ndb.put_multi(to_put, use_cache=False)
+        return len(to_put)
+
+
+def register(name, model_class, **options):
+    """Decorate transform(entity) to register it as a mapper over
+    model_class; options are passed on to Mapper."""
+    def decorator(transform):
+        MAPPERS[name] = Mapper(name, model_class, transform, **options)
+        return transform
+    return decorator
+
+
+def _scheduleMapper(job_id, countdown=0, transactional=False):
+    taskqueue.add(params={'job_id': job_id}, url='/tasks/mapper',
+                  countdown=countdown, transactional=transactional)
+
+
+def startMapper(name, dry_run=False):
+    """Create a MapperJob for the named mapper & queue its first task;
+    return the job.
+
+    Raise ValueError for an unknown mapper.
+    """
+    if name not in MAPPERS:
+        raise ValueError('Unknown mapper: %s' % name)
+    job = MapperJob(name=name, dryRun=dry_run)
+    job.put()
+    _scheduleMapper(job.key.id())
+    return job
+
+
+@ndb.transactional()
+def _checkpoint(job_key, seq, processed, written, cursor, countdown):
+    """Record batch seq & the cursor after it, queueing the task for the
+    next batch; return the job, or None if batch seq was recorded already.
+    """
+    job = job_key.get()
+    if job.status != 'running' or job.batches != seq:
+        return None
+    job.batches += 1
+    job.processed += processed
+    job.written += written
+    job.cursor = cursor
+    if cursor is None:
+        job.status = 'done'
+    else:
+        # queued only if this checkpoint commits, so the chain never forks
+        _scheduleMapper(job_key.id(), countdown=countdown,
+                        transactional=True)
+    job.put()
+    return job
+
+
+def runMapper(job_id):
+    """Map the next batch of a MapperJob."""
+    job = MapperJob.get_by_id(job_id)
+    if not job or job.status != 'running':
+        return
+    mapper = MAPPERS[job.name]
+    started = time.time()
+    processed, written, next_cursor = mapper.mapBatch(
+        Cursor(urlsafe=job.cursor) if job.cursor else None, job.dryRun)
+
+    # the writes of this batch should take written / writes_per_second
+    # seconds; wait out whatever the batch itself did not use
+    countdown = max(written / float(mapper.writes_per_second) -
+                    (time.time() - started), 0)
+    _checkpoint(job.key, job.batches, processed, written,
+                next_cursor.urlsafe() if next_cursor else None, countdown)
+
+
+def runLocal(name, dry_run=True):
+    """Run the named mapper to the end in-process, e.g. against testbed
+    stubs, without throttling; return its totals & throughput."""
+    mapper = MAPPERS[name]
+    cursor = None
+    batches = processed = written = 0
+    started = time.time()
+    while True:
+        batch_processed, batch_written, cursor = mapper.mapBatch(
+            cursor, dry_run)
+        batches += 1
+        processed += batch_processed
+        written += batch_written
+        if cursor is None:
+            break
+    seconds = time.time() - started
+    return {
+        'mapper': name,
+        'dryRun': dry_run,
+        'batches': batches,
+        'processed': processed,
+        'written': written,
+        'seconds': seconds,
+        'entitiesPerSecond': processed / seconds if seconds else None,
+    }
+
+
+# - - - Backfills - - - - - - - - - - - - - - - - - - - - - - -
+
+@register('speaker_name_lower', Speaker)
+def _speakerNameLower(speaker):
+    """Rewrite Speakers so their nameLower computed property is stored."""
+    return [speaker]
+
+
+@register('speaker_session_counts', Conference, batch_size=10)
+def _speakerSessionCounts(conf):
+    """Recount each speaker's sessions at a Conference; sessions created
+    while the batch runs may be missed, so run it when the agenda is
+    quiet."""
+    counts = collections.Counter(
+        each_session.speaker_key
+        for each_session in Session.query(ancestor=conf.key)
+        if each_session.speaker_key)
+    counters = dict(
+        (counter_key, 0) for counter_key in SpeakerSessionCount.query(
+            ancestor=conf.key).fetch(keys_only=True))
+    for speaker_key, count in counts.items():
+        counters[ConferenceApi._speakerSessionCountKey(
+            conf.key, speaker_key)] = count
+    return [SpeakerSessionCount(key=counter_key, count=count)
+            for counter_key, count in counters.items()]
+
+
+@register('profile_registrations', Profile, transactional=True)
+def _profileRegistrations(prof):
+    """Move Profile.conferenceKeysToAttend to SeatReservations, as many
+    as one transaction's entity groups allow at a time."""
+    if not prof.conferenceKeysToAttend:
+        return []
+    # each SeatReservation is an entity group of its own
+    moved = prof.conferenceKeysToAttend[:XG_TRANSACTION_GROUPS - 1]
+    reservations = ConferenceApi._ledgerProfileRegistrations(prof, moved)
+    prof.conferenceKeysToAttend = prof.conferenceKeysToAttend[len(moved):]
+    return reservations + [prof]
+
+
+@register('profile_wishlists', Profile, transactional=True)
+def _profileWishlists(prof):
+    """Move Profile.sessionKeysWishlist to WishlistEntry children."""
+    if not prof.sessionKeysWishlist:
+        return []
+    entries = [WishlistEntry(
+        key=ConferenceApi._wishlistEntryKey(prof.key, session_key),
+        sessionKey=session_key)
+        for session_key in prof.sessionKeysWishlist]
+    prof.sessionKeysWishlist = []
+    return entries + [prof]
+
+
+def _sessionsWithStaleSpeakerNames(sessions):
+    """Return the Sessions whose speaker name differs from their
+    speaker's, reading the batch's speakers in one get_multi."""
+    speaker_keys = list(set(each_session.speaker_key
+                            for each_session in sessions
+                            if each_session.speaker_key))
+    names = dict((speaker.key, speaker.name) for speaker in ndb.get_multi(
+        speaker_keys, use_cache=False, use_memcache=False) if speaker)
+    return [each_session for each_session in sessions
+            if each_session.speaker_key in names and
+            each_session.speaker_name != names[each_session.speaker_key]]
+
+
+@register('session_speaker_names', Session, transactional=True,
+          select=_sessionsWithStaleSpeakerNames)
+def _sessionSpeakerNames(each_session):
+    """Copy speaker names onto Sessions written before they were stored;
+    the speaker is read in the same transaction, so a concurrent rename
+    makes it retry rather than be overwritten."""
+    if not each_session.speaker_key:
+        return []
+    speaker = each_session.speaker_key.get(use_cache=False)
+    if not speaker or each_session.speaker_name == speaker.name:
+        return []
+    each_session.speaker_name = speaker.name
+    return [each_session]
@@ -28,10 +28,19 @@ class Profile(ndb.Model):
     displayName = ndb.StringProperty()
     mainEmail = ndb.StringProperty()
     teeShirtSize = ndb.StringProperty(default='NOT_SPECIFIED')
+    # legacy; moved to SeatReservations on the next registration call
     conferenceKeysToAttend = ndb.StringProperty(repeated=True)
+    # legacy; moved to WishlistEntry children on the next wishlist call
     sessionKeysWishlist = ndb.KeyProperty(repeated=True)
 
 
+class WishlistEntry(ndb.Model):
+    """WishlistEntry -- Session on a Profile's wishlist; child of the
+    Profile, with the websafe Session key as id"""
+    sessionKey = ndb.KeyProperty(kind='Session', indexed=False)
+    added = ndb.DateTimeProperty(auto_now_add=True)
+
+
 class ProfileMiniForm(messages.Message):
     """ProfileMiniForm -- update Profile form message"""
     displayName = messages.StringField(1)
@@ -57,6 +66,45 @@ class BooleanMessage(messages.Message):
     data = messages.BooleanField(1)
 
 
+class CacheStatsForm(messages.Message):
+    """CacheStatsForm -- hit/miss counters of one cache"""
+    name = messages.StringField(1)
+    hits = messages.IntegerField(2)
+    misses = messages.IntegerField(3)
+
+
+class CacheStatsForms(messages.Message):
+    """CacheStatsForms -- multiple CacheStatsForm outbound form message"""
+    items = messages.MessageField(CacheStatsForm, 1, repeated=True)
+
+
+class RpcStatsForm(messages.Message):
+    """RpcStatsForm -- RPC counters of one service"""
+    service = messages.StringField(1)
+    calls = messages.IntegerField(2)
+    totalMs = messages.FloatField(3)
+
+
+class EndpointStatsForm(messages.Message):
+    """EndpointStatsForm -- latency & RPC counters of one endpoint"""
+    name = messages.StringField(1)
+    calls = messages.IntegerField(2)
+    errors = messages.IntegerField(3)
+    totalMs = messages.FloatField(4)
+    maxMs = messages.FloatField(5)
+    entitiesRead = messages.IntegerField(6)
+    entitiesWritten = messages.IntegerField(7)
+    responseBytes = messages.IntegerField(8)  # of responseSamples calls
+    rpcs = messages.MessageField(RpcStatsForm, 9, repeated=True)
+    responseSamples = messages.IntegerField(10)
+    overBudget = messages.IntegerField(11)
+
+
+class EndpointStatsForms(messages.Message):
+    """EndpointStatsForms -- multiple EndpointStatsForm outbound message"""
+    items = messages.MessageField(EndpointStatsForm, 1, repeated=True)
+
+
 class Conference(ndb.Model):
     """Conference -- Conference object"""
     name = ndb.StringProperty(required=True)
@@ -69,6 +117,41 @@ class Conference(ndb.Model):
     endDate = ndb.DateProperty()
     maxAttendees = ndb.IntegerProperty()
     seatsAvailable = ndb.IntegerProperty()
+    seatShards = ndb.IntegerProperty(default=0)
+
+
+class SeatShard(ndb.Model):
+    """SeatShard -- one share of a Conference's available seats"""
+    seats = ndb.IntegerProperty(default=0, indexed=False)
+
+
+class SeatReservation(ndb.Model):
+    """SeatReservation -- a user's registration for a Conference, keyed by
+    '<websafeConferenceKey>:<userId>'; also records the SeatShard the seat
+    was taken from"""
+    conferenceKey = ndb.KeyProperty(kind=Conference)
+    userId = ndb.StringProperty()
+    # None for registrations made before seats were sharded
+    shardKey = ndb.KeyProperty(kind=SeatShard, indexed=False)
+    registered = ndb.DateTimeProperty(auto_now_add=True)
+
+
+class NearlySoldOut(ndb.Model):
+    """NearlySoldOut -- names of nearly sold out Conferences, by websafe key"""
+    conferences = ndb.JsonProperty()
+
+
+class AttendeeForm(messages.Message):
+    """AttendeeForm -- Conference attendee outbound form message"""
+    displayName = messages.StringField(1)
+    mainEmail = messages.StringField(2)
+    registered = messages.StringField(3)
+
+
+class AttendeeForms(messages.Message):
+    """AttendeeForms -- multiple AttendeeForm outbound form message"""
+    items = messages.MessageField(AttendeeForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
 
 
 class ConferenceForm(messages.Message):
@@ -90,13 +173,31 @@ class ConferenceForm(messages.Message):
 class ConferenceForms(messages.Message):
     """ConferenceForms -- multiple Conference outbound form message"""
     items = messages.MessageField(ConferenceForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
+
+
+class ConferenceSummaryForm(messages.Message):
+    """ConferenceSummaryForm -- Conference summary outbound form message"""
+    name = messages.StringField(1)
+    websafeKey = messages.StringField(2)
+
+
+class ConferenceSummaryForms(messages.Message):
+    """ConferenceSummaryForms --
+    multiple ConferenceSummaryForm outbound form message
+    """
+    items = messages.MessageField(ConferenceSummaryForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
 
 
 class Speaker(ndb.Model):
     """Speaker -- Speaker object"""
     name = ndb.StringProperty(required=True)
     bio = ndb.StringProperty()
+    # no longer maintained; query Session.speaker_key instead
     sessionKeysSpeakAt = ndb.KeyProperty(repeated=True)
+    # normalized name for prefix search, kept up to date on every put()
+    nameLower = ndb.ComputedProperty(lambda self: self.name.lower())
 
 
 class SpeakerForm(messages.Message):
@@ -116,6 +217,19 @@ class SpeakerMiniForm(messages.Message):
 class SpeakerForms(messages.Message):
     """SpeakerForms -- multiple Speaker outbound form message"""
     items = messages.MessageField(SpeakerForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
+
+
+class SpeakerSummaryForm(messages.Message):
+    """SpeakerSummaryForm -- Speaker summary outbound form message"""
+    name = messages.StringField(1)
+    websafeKey = messages.StringField(2)
+
+
+class SpeakerSummaryForms(messages.Message):
+    """SpeakerSummaryForms -- multiple SpeakerSummaryForm outbound message"""
+    items = messages.MessageField(SpeakerSummaryForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
 
 
 class Session(ndb.Model):
@@ -123,12 +237,41 @@ class Session(ndb.Model):
     name = ndb.StringProperty(required=True)
     highlights = ndb.StringProperty()
     speaker_key = ndb.KeyProperty()
+    # copy of the speaker's name, refreshed by a fan-out task on rename
+    speaker_name = ndb.StringProperty(indexed=False)
     duration = ndb.IntegerProperty()  # in minutes
     session_type = ndb.StringProperty()
     date = ndb.DateProperty()
     start_time = ndb.TimeProperty()
 
 
+class FeaturedSpeakerForm(messages.Message):
+    """FeaturedSpeakerForm -- featured Speaker of a Conference"""
+    websafeSpeakerKey = messages.StringField(1)
+    name = messages.StringField(2)
+    sessionNames = messages.StringField(3, repeated=True)
+
+
+class ConferenceFeaturedSpeakersForm(messages.Message):
+    """ConferenceFeaturedSpeakersForm -- featured Speakers of a Conference"""
+    websafeConferenceKey = messages.StringField(1)
+    speakers = messages.MessageField(FeaturedSpeakerForm, 2, repeated=True)
+
+
+class ConferenceFeaturedSpeakersForms(messages.Message):
+    """ConferenceFeaturedSpeakersForms --
+    multiple ConferenceFeaturedSpeakersForm outbound form message
+    """
+    items = messages.MessageField(ConferenceFeaturedSpeakersForm, 1,
+                                  repeated=True)
+
+
+class SpeakerSessionCount(ndb.Model):
+    """SpeakerSessionCount -- number of a Speaker's sessions at a Conference;
+    child of the Conference, keyed by websafe Speaker key"""
+    count = ndb.IntegerProperty(default=0, indexed=False)
+
+
 class SessionForm(messages.Message):
     """SessionForm -- Session outbound form message"""
     name = messages.StringField(1)
@@ -145,6 +288,82 @@ class SessionForm(messages.Message):
 class SessionForms(messages.Message):
     """SessionForms -- multiple Session outbound form message"""
     items = messages.MessageField(SessionForm, 1, repeated=True)
+    etag = messages.StringField(2)
+    notModified = messages.BooleanField(3)
+    nextPageToken = messages.StringField(4)
+    queryPlan = messages.StringField(5)
+
+
+class WishlistUpdateForm(messages.Message):
+    """WishlistUpdateForm -- sessions to add to and remove from wishlist"""
+    add = messages.StringField(1, repeated=True)
+    remove = messages.StringField(2, repeated=True)
+
+
+class WishlistUpdateResultForm(messages.Message):
+    """WishlistUpdateResultForm -- number of wishlist entries changed"""
+    added = messages.IntegerField(1)
+    removed = messages.IntegerField(2)
+
+
+class AgendaSpeakerForm(messages.Message):
+    """AgendaSpeakerForm -- new Speaker of an imported agenda"""
+    ref = messages.StringField(1)  # how sessions of the import refer to it
+    name = messages.StringField(2)
+    bio = messages.StringField(3)
+
+
+class AgendaSessionForm(messages.Message):
+    """AgendaSessionForm -- Session of an imported agenda; its speaker is
+    either a new speaker (speakerRef) or an existing one (speaker_key)"""
+    session = messages.MessageField(SessionForm, 1)
+    speakerRef = messages.StringField(2)
+
+
+class AgendaImportForm(messages.Message):
+    """AgendaImportForm -- agenda import inbound form message"""
+    speakers = messages.MessageField(AgendaSpeakerForm, 1, repeated=True)
+    sessions = messages.MessageField(AgendaSessionForm, 2, repeated=True)
+
+
+class AgendaSnapshot(ndb.Model):
+    """AgendaSnapshot -- serialized SessionForms of a Conference's agenda"""
+    # SessionForms encoded with protojson; None if too large to snapshot
+    payload = ndb.TextProperty()
+    etag = ndb.StringProperty(indexed=False)
+    # incremented each time the snapshot is stored
+    version = ndb.IntegerProperty(default=0, indexed=False)
+
+
+class ExportJob(ndb.Model):
+    """ExportJob -- progress of an export of one kind, resumed from cursor"""
+    kind = ndb.StringProperty(required=True)
+    format = ndb.StringProperty(required=True)
+    status = ndb.StringProperty(default='running')
+    cursor = ndb.StringProperty(indexed=False)
+    chunks = ndb.IntegerProperty(default=0, indexed=False)
+    rows = ndb.IntegerProperty(default=0, indexed=False)
+    created = ndb.DateTimeProperty(auto_now_add=True)
+    updated = ndb.DateTimeProperty(auto_now=True)
+
+
+class ExportChunk(ndb.Model):
+    """ExportChunk -- one batch of exported rows; child of its ExportJob,
+    with its 1-based sequence number as id"""
+    data = ndb.TextProperty(compressed=True)
+
+
+class MapperJob(ndb.Model):
+    """MapperJob -- progress of a mapper over one kind, resumed from cursor"""
+    name = ndb.StringProperty(required=True)
+    dryRun = ndb.BooleanProperty(default=False, indexed=False)
+    status = ndb.StringProperty(default='running')
+    cursor = ndb.StringProperty(indexed=False)
+    batches = ndb.IntegerProperty(default=0, indexed=False)
+    processed = ndb.IntegerProperty(default=0, indexed=False)
+    written = ndb.IntegerProperty(default=0, indexed=False)
+    created = ndb.DateTimeProperty(auto_now_add=True)
+    updated = ndb.DateTimeProperty(auto_now=True)
 
 
 class TeeShirtSize(messages.Enum):
@@ -178,6 +397,8 @@ class ConferenceQueryForms(messages.Message):
     multiple ConferenceQueryForm inbound form message
     """
     filters = messages.MessageField(ConferenceQueryForm, 1, repeated=True)
+    pageSize = messages.IntegerField(2)
+    pageToken = messages.StringField(3)
 
 
 class SessionQueryForm(messages.Message):
@@ -190,3 +411,6 @@ class SessionQueryForm(messages.Message):
 class SessionQueryForms(messages.Message):
     """SessionQueryForms -- multiple SessionQueryForm inbound form message"""
     filters = messages.MessageField(SessionQueryForm, 1, repeated=True)
+    pageSize = messages.IntegerField(2)
+    pageToken = messages.StringField(3)
+    debug = messages.BooleanField(4)
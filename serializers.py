@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""serializers.py
+
+Udacity conference server-side Python App Engine entity-to-form copying;
+the field mapping of every (model, form) pair is worked out once at import
+time instead of walking form.all_fields() for every entity.
+
+"""
+
+from models import Conference
+from models import ConferenceForm
+from models import Profile
+from models import ProfileForm
+from models import Session
+from models import SessionForm
+from models import Speaker
+from models import SpeakerForm
+from models import TeeShirtSize
+
+# (model class, form class) -> FormSerializer
+SERIALIZERS = {}
+
+
+def _copyValue(value):
+    return value
+
+
+def _toString(value):
+    return str(value)
+
+
+def _keyToUrlsafe(key):
+    return key.urlsafe() if key else None
+
+
+def _toTeeShirtSize(value):
+    return getattr(TeeShirtSize, value)
+
+
+class FormSerializer(object):
+    """FormSerializer -- copies one model's entities to one form class"""
+
+    def __init__(self, model_class, form_class, converters=None,
+                 key_field=None, exclude=()):
+        """Compile the plan: every form field that is also a model property
+        is copied, through its converter if one is given, unless it is in
+        exclude; key_field, if given, receives the entity's websafe key."""
+        converters = converters or {}
+        self.form_class = form_class
+        self.key_field = key_field
+        self.plan = tuple(
+            (field.name, converters.get(field.name, _copyValue))
+            for field in form_class.all_fields()
+            if field.name in model_class._properties and
+            field.name not in exclude)
+        # forms without required fields can skip check_initialized()
+        self.check = any(field.required for field in form_class.all_fields())
+
+    def serialize(self, entity, **extra):
+        """Return a form holding entity's fields plus any extra fields."""
+        form = self.form_class()
+        for name, convert in self.plan:
+            setattr(form, name, convert(getattr(entity, name)))
+        if self.key_field:
+            setattr(form, self.key_field, entity.key.urlsafe())
+        for name, value in extra.iteritems():
+            setattr(form, name, value)
+        if self.check:
+            form.check_initialized()
+        return form
+
+
+def register(model_class, form_class, **kwargs):
+    """Compile and register the serializer of a (model, form) pair."""
+    serializer = FormSerializer(model_class, form_class, **kwargs)
+    SERIALIZERS[(model_class, form_class)] = serializer
+    return serializer
+
+
+CONFERENCE_SERIALIZER = register(
+    Conference, ConferenceForm,
+    converters={'startDate': _toString, 'endDate': _toString},
+    key_field='websafeKey')
+
+# registrations & wishlists also live outside the Profile, so callers pass
+# conferenceKeysToAttend & sessionKeysWishlist as extra fields
+PROFILE_SERIALIZER = register(
+    Profile, ProfileForm,
+    converters={'teeShirtSize': _toTeeShirtSize},
+    exclude=('conferenceKeysToAttend', 'sessionKeysWishlist'))
+
+SESSION_SERIALIZER = register(
+    Session, SessionForm,
+    converters={'date': _toString, 'start_time': _toString,
+                'speaker_key': _keyToUrlsafe},
+    key_field='websafe_key')
+
+# Speaker.sessionKeysSpeakAt is no longer maintained; session keys come
+# from the Session.speaker_key index instead
+SPEAKER_SERIALIZER = register(
+    Speaker, SpeakerForm,
+    key_field='websafeKey',
+    exclude=('sessionKeysSpeakAt',))
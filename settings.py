@@ -16,3 +16,15 @@ WEB_CLIENT_ID = '684135836499-qmo8iv918ffgi8vs5cqafgjlc5drqoj3.apps.googleuserco
 ANDROID_CLIENT_ID = 'replace with Android client ID'
 IOS_CLIENT_ID = 'replace with iOS client ID'
 ANDROID_AUDIENCE = WEB_CLIENT_ID
+
+# Google's OAuth2 tokeninfo endpoint, used by utils.getUserId(id_type="oauth");
+# set the TOKENINFO_URL environment variable to point at a local stub instead
+TOKENINFO_URL = 'https://www.googleapis.com/oauth2/v1/tokeninfo'
+
+# log structured query diagnostics (see utils.logDebug); can also be turned
+# on with the CONFERENCE_DEBUG environment variable
+DEBUG_LOGGING = False
+
+# accounts allowed to read instrumentation counters (getCacheStats &
+# getEndpointStats)
+ADMIN_EMAILS = ()
@@ -414,6 +414,7 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.queryConferences = function () {
         $scope.submitted = false;
+        $scope.nextPageToken = null;
         if ($scope.selectedTab == 'ALL') {
             $scope.queryConferencesAll();
         } else if ($scope.selectedTab == 'YOU_HAVE_CREATED') {
@@ -423,13 +424,32 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
         }
     };
 
+    /**
+     * Fetches the next page of the conferences in the current tab and appends it to $scope.conferences.
+     */
+    $scope.loadMoreConferences = function () {
+        if (!$scope.nextPageToken) {
+            return;
+        }
+        if ($scope.selectedTab == 'ALL') {
+            $scope.queryConferencesAll($scope.nextPageToken);
+        } else if ($scope.selectedTab == 'YOU_WILL_ATTEND') {
+            $scope.getConferencesAttend($scope.nextPageToken);
+        }
+    };
+
     /**
      * Invokes the conference.queryConferences API.
+     *
+     * @param pageToken the nextPageToken of the previous page, or undefined for the first page.
      */
-    $scope.queryConferencesAll = function () {
+    $scope.queryConferencesAll = function (pageToken) {
         var sendFilters = {
             filters: []
         }
+        if (pageToken) {
+            sendFilters.pageToken = pageToken;
+        }
         for (var i = 0; i < $scope.filters.length; i++) {
             var filter = $scope.filters[i];
             if (filter.field && filter.operator && filter.value) {
@@ -458,10 +478,13 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
                         $scope.alertStatus = 'success';
                         $log.info($scope.messages);
 
-                        $scope.conferences = [];
+                        if (!pageToken) {
+                            $scope.conferences = [];
+                        }
                         angular.forEach(resp.items, function (conference) {
                             $scope.conferences.push(conference);
                         });
+                        $scope.nextPageToken = resp.nextPageToken;
                     }
                     $scope.submitted = true;
                 });
@@ -508,10 +531,12 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
     /**
      * Retrieves the conferences to attend by calling the conference.getProfile method and
      * invokes the conference.getConference method n times where n == the number of the conferences to attend.
+     *
+     * @param pageToken the nextPageToken of the previous page, or undefined for the first page.
      */
-    $scope.getConferencesAttend = function () {
+    $scope.getConferencesAttend = function (pageToken) {
         $scope.loading = true;
-        gapi.client.conference.getConferencesToAttend().
+        gapi.client.conference.getConferencesToAttend(pageToken ? {pageToken: pageToken} : {}).
             execute(function (resp) {
                 $scope.$apply(function () {
                     if (resp.error) {
@@ -527,7 +552,13 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
                         }
                     } else {
                         // The request has succeeded.
-                        $scope.conferences = resp.result.items;
+                        if (!pageToken) {
+                            $scope.conferences = [];
+                        }
+                        angular.forEach(resp.result.items, function (conference) {
+                            $scope.conferences.push(conference);
+                        });
+                        $scope.nextPageToken = resp.result.nextPageToken;
                         $scope.loading = false;
                         $scope.messages = 'Query succeeded : Conferences you will attend (or you have attended)';
                         $scope.alertStatus = 'success';
@@ -581,21 +612,19 @@ conferenceApp.controllers.controller('ConferenceDetailCtrl', function ($scope, $
 
         $scope.loading = true;
         // If the user is attending the conference, updates the status message and available function.
-        gapi.client.conference.getProfile().execute(function (resp) {
+        // Asks for this conference only, so a registration made just before is always seen.
+        gapi.client.conference.isRegisteredForConference({
+            websafeConferenceKey: $routeParams.websafeConferenceKey
+        }).execute(function (resp) {
             $scope.$apply(function () {
                 $scope.loading = false;
                 if (resp.error) {
-                    // Failed to get a user profile.
-                } else {
-                    var profile = resp.result;
-                    for (var i = 0; i < profile.conferenceKeysToAttend.length; i++) {
-                        if ($routeParams.websafeConferenceKey == profile.conferenceKeysToAttend[i]) {
-                            // The user is attending the conference.
-                            $scope.alertStatus = 'info';
-                            $scope.messages = 'You are attending this conference';
-                            $scope.isUserAttending = true;
-                        }
-                    }
+                    // Failed to get the registration.
+                } else if (resp.result.data) {
+                    // The user is attending the conference.
+                    $scope.alertStatus = 'info';
+                    $scope.messages = 'You are attending this conference';
+                    $scope.isUserAttending = true;
                 }
             });
         });
@@ -1,10 +1,46 @@
+import collections
+import hashlib
 import json
+import logging
 import os
+import threading
 import time
 import uuid
 
+from google.appengine.api import memcache
 from google.appengine.api import urlfetch
 from models import Profile
+from settings import DEBUG_LOGGING
+from settings import TOKENINFO_URL
+
+MEMCACHE_TOKEN_KEY = "TOKEN:%s"
+TOKEN_CACHE_SIZE = 1000         # tokens kept in each instance's LRU
+TOKEN_CACHE_MAX_AGE = 3600      # seconds, even if the token lives longer
+TOKENINFO_ATTEMPTS = 3
+TOKENINFO_DEADLINE = 5          # seconds per tokeninfo attempt
+
+# token hash -> (user_id, expiry timestamp), least recently used first
+_token_cache = collections.OrderedDict()
+_token_cache_lock = threading.Lock()
+
+# hit/miss counters of the read-through caches, by cache name; they are
+# kept per instance and start from zero whenever an instance starts
+CACHE_STATS = collections.defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def recordCacheLookup(cache_name, hit):
+    CACHE_STATS[cache_name]['hits' if hit else 'misses'] += 1
+
+
+def debugLoggingEnabled():
+    return DEBUG_LOGGING or bool(os.getenv('CONFERENCE_DEBUG'))
+
+
+def logDebug(event, **fields):
+    """Log event & fields as one JSON object when debug logging is on."""
+    if debugLoggingEnabled():
+        fields['event'] = event
+        logging.debug(json.dumps(fields, default=str, sort_keys=True))
 
 
 def getUserId(user, id_type="email"):
@@ -15,25 +51,14 @@ def getUserId(user, id_type="email"):
         """A workaround implementation for getting userid."""
         auth = os.getenv('HTTP_AUTHORIZATION')
         bearer, token = auth.split()
-        token_type = 'id_token'
-        if 'OAUTH_USER_ID' in os.environ:
-            token_type = 'access_token'
-        url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-               % (token_type, token))
-        user = {}
-        wait = 1
-        for i in range(3):
-            resp = urlfetch.fetch(url)
-            if resp.status_code == 200:
-                user = json.loads(resp.content)
-                break
-            elif resp.status_code == 400 and 'invalid_token' in resp.content:
-                url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-                       % ('access_token', token))
-            else:
-                time.sleep(wait)
-                wait = wait + i
-        return user.get('user_id', '')
+        token_hash = hashlib.sha256(token).hexdigest()
+        user_id = _getCachedUserId(token_hash)
+        if user_id is None:
+            user = _fetchTokenInfo(token)
+            user_id = user.get('user_id', '')
+            if user_id:
+                _cacheUserId(token_hash, user_id, user.get('expires_in'))
+        return user_id
 
     if id_type == "custom":
         # implement your own user_id creation and getting algorythm
@@ -44,3 +69,69 @@ def getUserId(user, id_type="email"):
             return profile.id()
         else:
             return str(uuid.uuid1().get_hex())
+
+
+def _getCachedUserId(token_hash):
+    """Return the user_id cached for a token hash, or None."""
+    now = time.time()
+    with _token_cache_lock:
+        entry = _token_cache.pop(token_hash, None)
+        if entry and entry[1] > now:
+            # re-insert to mark it most recently used
+            _token_cache[token_hash] = entry
+            recordCacheLookup('token', True)
+            return entry[0]
+
+    entry = memcache.get(MEMCACHE_TOKEN_KEY % token_hash)
+    recordCacheLookup('token', entry is not None)
+    if entry is None:
+        return None
+    _storeLocalUserId(token_hash, *entry)
+    return entry[0]
+
+
+def _cacheUserId(token_hash, user_id, expires_in):
+    """Cache user_id for a token until the token expires."""
+    try:
+        ttl = min(int(expires_in), TOKEN_CACHE_MAX_AGE)
+    except (TypeError, ValueError):
+        ttl = TOKEN_CACHE_MAX_AGE
+    if ttl <= 0:
+        return
+    expires_at = time.time() + ttl
+    _storeLocalUserId(token_hash, user_id, expires_at)
+    memcache.set(MEMCACHE_TOKEN_KEY % token_hash, (user_id, expires_at),
+                 time=ttl)
+
+
+def _storeLocalUserId(token_hash, user_id, expires_at):
+    with _token_cache_lock:
+        _token_cache.pop(token_hash, None)
+        _token_cache[token_hash] = (user_id, expires_at)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+
+def _fetchTokenInfo(token):
+    """Look a token up at the tokeninfo endpoint; return {} on failure.
+
+    Failed attempts are retried straight away with a short deadline
+    rather than sleeping between them.
+    """
+    tokeninfo_url = os.getenv('TOKENINFO_URL', TOKENINFO_URL)
+    token_type = 'id_token'
+    if 'OAUTH_USER_ID' in os.environ:
+        token_type = 'access_token'
+    for i in range(TOKENINFO_ATTEMPTS):
+        url = '%s?%s=%s' % (tokeninfo_url, token_type, token)
+        rpc = urlfetch.create_rpc(deadline=TOKENINFO_DEADLINE)
+        urlfetch.make_fetch_call(rpc, url)
+        try:
+            resp = rpc.get_result()
+        except urlfetch.Error:
+            continue
+        if resp.status_code == 200:
+            return json.loads(resp.content)
+        elif resp.status_code == 400 and 'invalid_token' in resp.content:
+            token_type = 'access_token'
+    return {}